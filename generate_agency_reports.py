@@ -4,12 +4,45 @@ Agency Intelligence Report Generator
 Generates personalized secret-URL reports for each BainUltra agency
 """
 
+import argparse
+import ast
+import concurrent.futures
+import csv
+import difflib
+import heapq
+import hmac
+import http.client
+import http.server
+import io
 import json
 import hashlib
+import math
+import mimetypes
+import mmap
+import operator
 import os
-from datetime import datetime
+import queue
+import re
+import statistics
+import struct
+import subprocess
+import sys
+import tarfile
+import time
+import urllib.parse
+import zipfile
+import zlib
+from array import array
+from datetime import datetime, timezone
 from pathlib import Path
 
+# Optional: columnar export (Parquet / Arrow IPC); CSV is used without it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
 # Territory mapping
 TERRITORIES = {
     "Phoenix S G, LLC": "NY/NJ/PA",
@@ -38,6 +71,34 @@ TERRITORIES = {
     "Hawaii": "HI"
 }
 
+# Territory hierarchy: agency -> (country, region)
+TERRITORY_HIERARCHY = {
+    "Phoenix S G, LLC": ("US", "Northeast"),
+    "Alpha Sales": ("US", "Northeast"),
+    "Upstate NewYork": ("US", "Northeast"),
+    "JDL Associates": ("US", "Southeast"),
+    "The Bridge Agency": ("US", "Southeast"),
+    "The Bridge Agency GA": ("US", "Southeast"),
+    "Personal Touch Sales": ("US", "Southeast"),
+    "D'Antoni Sales Group": ("US", "Southeast"),
+    "The Shae Group": ("US", "Midwest"),
+    "ClearWater Sales LLC": ("US", "Midwest"),
+    "VJS Marketing": ("US", "Midwest"),
+    "ADream Decor": ("US", "South Central"),
+    "Summit Architectural Resource": ("US", "Mountain"),
+    "Utah - Wyoming": ("US", "Mountain"),
+    "Premier Decorative Group": ("US", "West"),
+    "The Rain Company": ("US", "West"),
+    "Hawaii": ("US", "West"),
+    "BU Agent - Ontario": ("Canada", "Ontario"),
+    "Greater Montreal": ("Canada", "Quebec"),
+    "Quebec excluding MTL (+ Ottawa Region)": ("Canada", "Quebec"),
+    "DME Marketing": ("Canada", "Western Canada"),
+    "S & D Lighting Group": ("Canada", "Atlantic Canada"),
+    "Mexico": ("Mexico", "Mexico"),
+    "BainUltra Corporate": ("Direct", "Corporate")
+}
+
 # Account-level data: 10-year avg, 2024, 2025
 ACCOUNT_DATA = {
     "ADream Decor": {
@@ -402,6 +463,21 @@ ACCOUNT_DATA = {
 }
 
 
+# Account status thresholds, as multiples of the account's 2024 revenue
+ACCOUNT_STATUS_THRESHOLDS = {
+    "growing": 1.1,     # 2025 above 110% of 2024
+    "at_risk": 0.5,     # 2025 below 50% of 2024
+    "declining": 0.85   # 2025 below 85% of 2024
+}
+
+# Status labels and CSS classes, in classification order
+ACCOUNT_STATUSES = [
+    ("Growing", "status-growing"),
+    ("At Risk", "status-at-risk"),
+    ("Declining", "status-declining"),
+    ("Stable", "status-stable")
+]
+
 # 10-year revenue data (from Salesforce query)
 AGENCY_YEARLY_DATA = {
     "ADream Decor": {
@@ -502,11 +578,336 @@ AGENCY_YEARLY_DATA = {
     }
 }
 
+# Per-agency metric columns written by the export stage (rev_<year> columns follow)
+METRIC_EXPORT_FIELDS = [
+    "agency", "token", "territory", "rev_2025", "rev_2024", "yoy_change", "ten_year_avg",
+    "vs_ten_year", "pre_covid_avg", "covid_peak", "trend", "forecast_value", "forecast_low", "forecast_high",
+    "growth_rank", "yoy_change_pct", "vs_ten_year_pct", "recovery_pct",
+    "top5_share", "hhi", "churned_accounts", "churned_revenue", "reactivated_accounts", "reactivated_revenue"
+]
+
+# Site root (this repository) and the agency reports directory within it
+SITE_DIR = Path(__file__).resolve().parent
+REPORTS_DIR = "agency-reports"
+
+# Output destinations written as a single bundle file
+BUNDLE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".zip")
+
+# Archive: store a full copy instead of a delta every N versions of a file
+ARCHIVE_KEYFRAME_INTERVAL = 30
+
+# Archived files under this directory are internal (e.g. computed metrics) and never published
+ARCHIVE_INTERNAL_DIR = "metrics"
+
+# Previous run's per-agency state, compared against to report what changed
+DIFF_STATE_PATH = f"{REPORTS_DIR}/state.json"
+
+# Dataset literals in this script: --watch reloads them in place, and editing them
+# is a data change rather than a template change
+DATASET_BLOCK = re.compile(r"^(TERRITORIES|ACCOUNT_DATA|AGENCY_YEARLY_DATA) = (\{.*?^\})$", re.M | re.S)
+
+# Binary dataset snapshot format
+SNAPSHOT_MAGIC = b"BUSNAP\0\0"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sHHHxxIIQQQQQ")
+SNAPSHOT_ACCOUNT_FIELDS = ("ten_year_avg", "rev_2024", "rev_2025")
+
+# Years every agency series is expected to cover
+EXPECTED_YEARS = list(range(2015, 2026))
+
+# Data validation thresholds
+VALIDATION_THRESHOLDS = {
+    "yoy_robust_z": 3.5,              # flag agency-year changes beyond this robust z-score
+    "account_spike_ratio": 4,         # flag accounts whose 2024 revenue exceeds N x their 10-year avg
+    "account_total_tolerance": 0.001  # allowed rounding when account sums exceed agency totals
+}
+
+# Decimal places kept for chart data when minifying; tooltips show values with
+# toLocaleString(), which displays up to 3 decimals
+CHART_VALUE_DECIMALS = 3
+
+# Print/PDF layout: US Letter in points, and print-friendly colors (RGB 0-1)
+PDF_PAGE_SIZE = (612, 792)
+PDF_MARGIN = 48
+PDF_COLORS = {
+    "text": (0.07, 0.09, 0.15),
+    "muted": (0.42, 0.45, 0.50),
+    "rule": (0.82, 0.84, 0.86),
+    "panel": (0.95, 0.96, 0.97),
+    "bar": (0.15, 0.39, 0.92),
+    "forecast": (0.49, 0.23, 0.93),
+    "positive": (0.02, 0.59, 0.41),
+    "negative": (0.86, 0.15, 0.15),
+    "neutral": (0.79, 0.54, 0.02),
+    "at_risk": (0.92, 0.35, 0.05)
+}
+
+# Helvetica advance widths (1/1000 em) for characters 32-126, from the standard AFM
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584
+]
+
+# Account fields reconciled against the agency metric of the same name
+RECONCILED_FIELDS = ("ten_year_avg", "rev_2024", "rev_2025")
+
+# Peer benchmarking: metrics every agency is ranked on across all agencies, with display labels
+PEER_METRICS = {
+    "yoy_change": "vs 2024",
+    "vs_ten_year": "vs 10-Year Avg",
+    "recovery": "Recovery vs COVID Peak"
+}
+
+# Recommendation rules, evaluated against each agency's facts (see build_recommendation_facts).
+# A rule applies when all of its (fact, operator, value) conditions hold; its text is
+# formatted with the agency's facts. Lower priority numbers are listed first.
+RECOMMENDATION_RULES = [
+    {
+        "id": "churned_accounts",
+        "priority": 1,
+        "when": [("churned_count", ">", 0)],
+        "text": "Win back accounts that bought in 2024 but not in 2025 "
+                "({churned_count}, ${churned_revenue:,.0f} of 2024 revenue): {churned_names}"
+    },
+    {
+        "id": "declining_top_accounts",
+        "priority": 1,
+        "when": [("declining_top_count", ">=", 2)],
+        "text": "{declining_top_count} of your top 5 accounts are declining or at risk - "
+                "schedule account reviews with {declining_top_names}"
+    },
+    {
+        "id": "concentration_risk",
+        "priority": 2,
+        "when": [("hhi", ">", 2500), ("account_count", ">", 5)],
+        "text": "Your top 5 accounts make up {top5_share:.0f}% of listed 2025 revenue (Herfindahl index {hhi:,.0f}) - "
+                "develop the next tier of accounts to reduce concentration risk"
+    },
+    {
+        "id": "below_history",
+        "priority": 2,
+        "when": [("vs_ten_year", "<", -15)],
+        "text": "2025 revenue is {vs_ten_year:+.0f}% against your 10-year average - "
+                "focus on reactivating dormant accounts"
+    },
+    {
+        "id": "peer_laggard",
+        "priority": 3,
+        "when": [("yoy_change_pct", "<", 25)],
+        "text": "Year-over-year growth ranks #{growth_rank} of {peer_count} agencies - "
+                "compare your programs with the fastest-growing territories"
+    },
+    {
+        "id": "forecast_decline",
+        "priority": 3,
+        "when": [("forecast_change", "<", -5)],
+        "text": "The revenue trend projects {forecast_change:+.0f}% for next year - "
+                "plan pipeline to offset the decline"
+    },
+    {
+        "id": "reactivated_accounts",
+        "priority": 4,
+        "when": [("reactivated_count", ">", 0)],
+        "text": "Build on accounts reactivated in 2025 after a year without revenue "
+                "({reactivated_count}, ${reactivated_revenue:,.0f} of 2025 revenue): {reactivated_names}"
+    },
+    {
+        "id": "growing",
+        "priority": 4,
+        "when": [("trend", "==", "growing")],
+        "text": "Continue current strategy - territory is growing ({yoy_change:+.1f}% vs 2024)"
+    },
+    {
+        "id": "top_account_growth",
+        "priority": 5,
+        "when": [("account_count", ">", 0)],
+        "text": "Review top accounts ({top_names}) for growth opportunities"
+    }
+]
+
+# Comparison operators available to recommendation rule conditions
+RULE_OPERATORS = {
+    "<": operator.lt, "<=": operator.le, ">": operator.gt,
+    ">=": operator.ge, "==": operator.eq, "!=": operator.ne
+}
+
+# Revenue forecasting: years used to fit each agency's trend line
+FORECAST_FIT_YEARS = list(range(2015, 2026))
+
+# Two-sided 95% Student t critical values by degrees of freedom
+T_CRITICAL_95 = {
+    1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306,
+    9: 2.262, 10: 2.228, 12: 2.179, 15: 2.131, 20: 2.086, 30: 2.042, 60: 2.000, 120: 1.980
+}
+
+def compile_snapshot(path, yearly_data=None, account_data=None, territories=None):
+    """Compile the dataset into a binary snapshot that can be memory-mapped"""
+    # Layout (little-endian): header, int64 year matrix (-1 for missing years), uint32 agency index,
+    # int64 account value columns, uint32 account name index, then a UTF-8 string table
+    yearly_data = AGENCY_YEARLY_DATA if yearly_data is None else yearly_data
+    account_data = ACCOUNT_DATA if account_data is None else account_data
+    territories = TERRITORIES if territories is None else territories
+
+    agencies = list(dict.fromkeys([*yearly_data, *account_data, *territories]))
+    all_years = sorted({year for series in yearly_data.values() for year in series})
+    first_year = all_years[0] if all_years else 0
+    year_count = all_years[-1] - first_year + 1 if all_years else 0
+
+    strings = bytearray()
+
+    def add_string(text):
+        encoded = text.encode("utf-8")
+        offset = len(strings)
+        strings.extend(encoded)
+        return offset, len(encoded)
+
+    year_matrix = array("q")
+    agency_index = array("I")
+    account_values = array("q")
+    account_names = array("I")
+    account_count = 0
+    for agency in agencies:
+        series = yearly_data.get(agency, {})
+        year_matrix.extend(int(series.get(first_year + i, -1)) for i in range(year_count))
+        accounts = account_data.get(agency, {})
+        agency_index.extend(add_string(agency))
+        agency_index.extend(add_string(territories.get(agency, "Unknown")))
+        agency_index.extend((account_count, len(accounts)))
+        for acct_name, values in accounts.items():
+            account_names.extend(add_string(acct_name))
+            account_values.extend(int(values.get(field, 0)) for field in SNAPSHOT_ACCOUNT_FIELDS)
+        account_count += len(accounts)
+
+    def pad(offset):
+        return offset + (-offset % 8)
+
+    years_offset = SNAPSHOT_HEADER.size
+    agencies_offset = pad(years_offset + len(year_matrix) * 8)
+    values_offset = pad(agencies_offset + len(agency_index) * 4)
+    names_offset = pad(values_offset + len(account_values) * 8)
+    strings_offset = pad(names_offset + len(account_names) * 4)
+
+    with open(path, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(
+            SNAPSHOT_MAGIC, SNAPSHOT_VERSION, first_year, year_count, len(agencies), account_count,
+            agencies_offset, values_offset, names_offset, strings_offset, len(strings)
+        ))
+        for offset, block in ((years_offset, year_matrix), (agencies_offset, agency_index),
+                              (values_offset, account_values), (names_offset, account_names),
+                              (strings_offset, strings)):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(block if isinstance(block, bytearray) else block.tobytes())
+    return path
+
+class Snapshot:
+    """Read-only, memory-mapped view of a compiled dataset snapshot"""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.first_year, self.year_count, self.agency_count, self.account_count,
+         agencies_offset, values_offset, names_offset, strings_offset, strings_len) = SNAPSHOT_HEADER.unpack_from(self._mm)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {SNAPSHOT_VERSION} dataset snapshot")
+
+        view = memoryview(self._mm)
+        fields = len(SNAPSHOT_ACCOUNT_FIELDS)
+        self._years = view[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + self.agency_count * self.year_count * 8].cast("q")
+        self._agencies = view[agencies_offset:agencies_offset + self.agency_count * 24].cast("I")
+        self._values = view[values_offset:values_offset + self.account_count * fields * 8].cast("q")
+        self._names = view[names_offset:names_offset + self.account_count * 8].cast("I")
+        self._strings = view[strings_offset:strings_offset + strings_len]
+        self._index = {self._string(self._agencies, i * 6): i for i in range(self.agency_count)}
+
+    def _string(self, table, pos):
+        offset, length = table[pos], table[pos + 1]
+        return str(self._strings[offset:offset + length], "utf-8")
+
+    def close(self):
+        """Release the mapping; views returned by year_row() must be released first"""
+        for name in ("_years", "_agencies", "_values", "_names", "_strings"):
+            if hasattr(self, name):
+                getattr(self, name).release()
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def agencies(self):
+        """Agency names in snapshot order"""
+        return list(self._index)
+
+    def agency_for_token(self, token):
+        """Agency name for a report token, or None; the token index is built on first use"""
+        if not hasattr(self, "_tokens"):
+            self._tokens = {generate_token(agency): agency for agency in self._index}
+        return self._tokens.get(token)
+
+    def year_row(self, agency):
+        """Zero-copy int64 view of an agency's yearly revenue (-1 marks a missing year)"""
+        start = self._index[agency] * self.year_count
+        return self._years[start:start + self.year_count]
+
+    def yearly_data(self, agency):
+        """Yearly revenue for one agency as {year: revenue}"""
+        return {self.first_year + i: value for i, value in enumerate(self.year_row(agency)) if value >= 0}
+
+    def territory(self, agency):
+        return self._string(self._agencies, self._index[agency] * 6 + 2)
+
+    def accounts(self, agency):
+        """Account rows for one agency as {account: {field: value}}"""
+        pos = self._index[agency] * 6
+        first, count = self._agencies[pos + 4], self._agencies[pos + 5]
+        fields = len(SNAPSHOT_ACCOUNT_FIELDS)
+        return {
+            self._string(self._names, i * 2): dict(zip(SNAPSHOT_ACCOUNT_FIELDS, self._values[i * fields:(i + 1) * fields]))
+            for i in range(first, first + count)
+        }
+
+    def to_dataset(self):
+        """Materialise (yearly data, account data, territories) dicts for the whole snapshot"""
+        yearly = {agency: self.yearly_data(agency) for agency in self._index}
+        return (
+            {agency: series for agency, series in yearly.items() if series},
+            {agency: accounts for agency in self._index if (accounts := self.accounts(agency))},
+            {agency: self.territory(agency) for agency in self._index}
+        )
+
+def use_dataset(yearly_data, account_data, territories):
+    """Swap the module-level dataset, e.g. for one loaded from a snapshot"""
+    global AGENCY_YEARLY_DATA, ACCOUNT_DATA, TERRITORIES
+    AGENCY_YEARLY_DATA, ACCOUNT_DATA, TERRITORIES = yearly_data, account_data, territories
+
 def generate_token(agency_name):
     """Generate a unique secret token for each agency"""
     secret = f"bainultra-2026-{agency_name}-secret"
     return hashlib.sha256(secret.encode()).hexdigest()[:12]
 
+def load_agency(agency=None, token=None, snapshot_path=None):
+    """Load one agency's (name, yearly data, accounts, territory) by name or token, or None"""
+    if snapshot_path:
+        with Snapshot(snapshot_path) as snapshot:
+            name = agency if agency is not None else snapshot.agency_for_token(token)
+            if name not in snapshot.agencies():
+                return None
+            return name, snapshot.yearly_data(name), snapshot.accounts(name), snapshot.territory(name)
+
+    if agency is None:
+        agency = next((name for name in AGENCY_YEARLY_DATA if generate_token(name) == token), None)
+    if agency not in AGENCY_YEARLY_DATA:
+        return None
+    return agency, AGENCY_YEARLY_DATA[agency], ACCOUNT_DATA.get(agency, {}), TERRITORIES.get(agency, "Unknown")
+
 def calculate_metrics(agency_name, yearly_data):
     """Calculate all metrics for an agency"""
     years = sorted(yearly_data.keys())
@@ -552,6 +953,82 @@ def calculate_metrics(agency_name, yearly_data):
         "yearly_data": yearly_data
     }
 
+def t_critical_95(dof):
+    """Two-sided 95% Student t critical value for the given degrees of freedom"""
+    if dof in T_CRITICAL_95:
+        return T_CRITICAL_95[dof]
+    larger = [d for d in T_CRITICAL_95 if d > dof]
+    return T_CRITICAL_95[min(larger)] if larger else 1.96
+
+def forecast_agencies(yearly_series, fit_years=None, target_year=None):
+    """Project next year's revenue and its 95% range for every agency with batched least-squares fits"""
+    fit_years = list(fit_years or FORECAST_FIT_YEARS)
+    target_year = target_year or max(fit_years) + 1
+
+    by_years = {}
+    for agency, series in yearly_series.items():
+        # Years before the agency existed and gaps with no revenue are missing data, not zeros
+        years = tuple(year for year in fit_years if series.get(year))
+        if len(years) >= 3:
+            by_years.setdefault(years, []).append(agency)
+
+    forecasts = {}
+    for years, agencies in by_years.items():
+        # Shared solve: slope = w . y with w = (x - x_mean) / Sxx, intercept = mean(y) at x_mean
+        n = len(years)
+        x_mean = sum(years) / n
+        centered = [year - x_mean for year in years]
+        sxx = sum(c * c for c in centered)
+        slope_weights = [c / sxx for c in centered]
+        x_target = target_year - x_mean
+        interval_scale = t_critical_95(n - 2) * math.sqrt(1 + 1 / n + x_target * x_target / sxx)
+
+        for agency in agencies:
+            values = [yearly_series[agency][year] for year in years]
+            mean = sum(values) / n
+            slope = sum(w * v for w, v in zip(slope_weights, values))
+            residual_ss = sum((v - mean - slope * c) ** 2 for v, c in zip(values, centered))
+            margin = interval_scale * math.sqrt(residual_ss / (n - 2))
+            value = max(mean + slope * x_target, 0)
+            forecasts[agency] = {
+                "year": target_year,
+                "value": value,
+                "low": max(value - margin, 0),
+                "high": value + margin
+            }
+    return forecasts
+
+def peer_values(metrics):
+    """An agency's values for each PEER_METRICS entry (recovery is 2025 revenue as % of COVID peak)"""
+    return {
+        "yoy_change": metrics["yoy_change"],
+        "vs_ten_year": metrics["vs_ten_year"],
+        "recovery": metrics["rev_2025"] / metrics["covid_peak"] * 100 if metrics["covid_peak"] > 0 else None
+    }
+
+def rank_peers(values):
+    """Percentile ranks of every agency on each peer metric, from one sort per metric"""
+    ranks = {agency: {"count": len(values), "percentiles": {}, "growth_rank": None} for agency in values}
+    for metric in PEER_METRICS:
+        ordered = sorted((v[metric], agency) for agency, v in values.items() if v[metric] is not None)
+        start = 0
+        while start < len(ordered):
+            end = start
+            while end < len(ordered) and ordered[end][0] == ordered[start][0]:
+                end += 1
+            percentile = (start + (end - start) / 2) / len(ordered) * 100
+            for _, agency in ordered[start:end]:
+                ranks[agency]["percentiles"][metric] = percentile
+                if metric == "yoy_change":
+                    ranks[agency]["growth_rank"] = len(ordered) - end + 1
+            start = end
+    return ranks
+
+def ordinal(n):
+    """1 -> '1st', 22 -> '22nd', 13 -> '13th'"""
+    suffix = "th" if 10 <= n % 100 <= 20 else {1: "st", 2: "nd", 3: "rd"}.get(n % 10, "th")
+    return f"{n}{suffix}"
+
 def format_currency(amount):
     """Format number as currency"""
     if amount >= 1000000:
@@ -561,6 +1038,76 @@ def format_currency(amount):
     else:
         return f"${amount:.0f}"
 
+def classify_account(data, thresholds=None):
+    """Return (yoy %, status, status CSS class) for a single account"""
+    thresholds = thresholds or ACCOUNT_STATUS_THRESHOLDS
+    rev_2024 = data.get("rev_2024", 0)
+    rev_2025 = data.get("rev_2025", 0)
+
+    # Calculate YoY change
+    if rev_2024 > 0:
+        yoy = ((rev_2025 - rev_2024) / rev_2024) * 100
+    else:
+        yoy = 100 if rev_2025 > 0 else 0
+
+    # Determine status
+    if rev_2025 > rev_2024 * thresholds["growing"]:
+        return (yoy,) + ACCOUNT_STATUSES[0]
+    elif rev_2025 < rev_2024 * thresholds["at_risk"]:
+        return (yoy,) + ACCOUNT_STATUSES[1]
+    elif rev_2025 < rev_2024 * thresholds["declining"]:
+        return (yoy,) + ACCOUNT_STATUSES[2]
+    return (yoy,) + ACCOUNT_STATUSES[3]
+
+def flatten_account_data(agencies=None, account_data=None):
+    """Flatten ACCOUNT_DATA into parallel columns for batch processing"""
+    account_data = ACCOUNT_DATA if account_data is None else account_data
+    columns = {"agency": [], "account": [], "ten_year_avg": [], "rev_2024": [], "rev_2025": []}
+    for agency in (account_data if agencies is None else agencies):
+        accounts = account_data.get(agency, {})
+        columns["agency"].extend([agency] * len(accounts))
+        columns["account"].extend(accounts.keys())
+        columns["ten_year_avg"].extend(a.get("ten_year_avg", 0) for a in accounts.values())
+        columns["rev_2024"].extend(a.get("rev_2024", 0) for a in accounts.values())
+        columns["rev_2025"].extend(a.get("rev_2025", 0) for a in accounts.values())
+    return columns
+
+def classify_accounts_batch(columns, thresholds=None):
+    """Classify every account in one pass over columnar data"""
+    thresholds = thresholds or ACCOUNT_STATUS_THRESHOLDS
+    growing, at_risk, declining = thresholds["growing"], thresholds["at_risk"], thresholds["declining"]
+    rev_2024, rev_2025 = columns["rev_2024"], columns["rev_2025"]
+
+    # Status index into ACCOUNT_STATUSES; same branch order as classify_account
+    status_index = [
+        0 if cur > prev * growing else 1 if cur < prev * at_risk else 2 if cur < prev * declining else 3
+        for prev, cur in zip(rev_2024, rev_2025)
+    ]
+    yoy = [
+        (cur - prev) / prev * 100 if prev > 0 else (100 if cur > 0 else 0)
+        for prev, cur in zip(rev_2024, rev_2025)
+    ]
+
+    labels = [label for label, _ in ACCOUNT_STATUSES]
+    by_agency = {}
+    for agency, idx, prev in zip(columns["agency"], status_index, rev_2024):
+        totals = by_agency.get(agency)
+        if totals is None:
+            totals = by_agency[agency] = {"counts": [0, 0, 0, 0], "revenue_at_risk": 0}
+        totals["counts"][idx] += 1
+        if idx == 1:
+            totals["revenue_at_risk"] += prev
+
+    return {
+        "yoy": yoy,
+        "status": [labels[i] for i in status_index],
+        "status_class": [ACCOUNT_STATUSES[i][1] for i in status_index],
+        "by_agency": {
+            agency: {"counts": dict(zip(labels, t["counts"])), "revenue_at_risk": t["revenue_at_risk"]}
+            for agency, t in by_agency.items()
+        }
+    }
+
 def generate_account_rows(agency_name):
     """Generate HTML table rows for account data"""
     accounts = ACCOUNT_DATA.get(agency_name, {})
@@ -575,26 +1122,7 @@ def generate_account_rows(agency_name):
         avg = data.get("ten_year_avg", 0)
         rev_2024 = data.get("rev_2024", 0)
         rev_2025 = data.get("rev_2025", 0)
-
-        # Calculate YoY change
-        if rev_2024 > 0:
-            yoy = ((rev_2025 - rev_2024) / rev_2024) * 100
-        else:
-            yoy = 100 if rev_2025 > 0 else 0
-
-        # Determine status
-        if rev_2025 > rev_2024 * 1.1:
-            status = "Growing"
-            status_class = "status-growing"
-        elif rev_2025 < rev_2024 * 0.5:
-            status = "At Risk"
-            status_class = "status-at-risk"
-        elif rev_2025 < rev_2024 * 0.85:
-            status = "Declining"
-            status_class = "status-declining"
-        else:
-            status = "Stable"
-            status_class = "status-stable"
+        yoy, status, status_class = classify_account(data)
 
         yoy_class = "positive" if yoy > 0 else "negative" if yoy < -5 else "neutral"
         yoy_sign = "+" if yoy > 0 else ""
@@ -612,6 +1140,165 @@ def generate_account_rows(agency_name):
 
     return "\n".join(rows)
 
+def reconcile_accounts(agencies_data):
+    """Reconcile listed account totals against each agency's own figures"""
+    columns = flatten_account_data(agencies_data.keys())
+    listed = {agency: dict.fromkeys(RECONCILED_FIELDS, 0) for agency in agencies_data}
+    for i, agency in enumerate(columns["agency"]):
+        sums = listed[agency]
+        for field in RECONCILED_FIELDS:
+            sums[field] += columns[field][i]
+
+    reconciliation = {}
+    for agency, sums in listed.items():
+        metrics = agencies_data[agency]["metrics"]
+        reconciliation[agency] = {}
+        for field, total in sums.items():
+            agency_total = metrics[field]
+            reconciliation[agency][field] = {
+                "agency_total": agency_total,
+                "listed": total,
+                "other": agency_total - total,
+                "coverage": (total / agency_total * 100) if agency_total > 0 else 0
+            }
+    return reconciliation
+
+def generate_reconciliation_rows(reconciliation):
+    """Generate listed-total and other/unlisted rows for the account table"""
+    if not reconciliation or not any(r["listed"] for r in reconciliation.values()):
+        return ""
+    cells = {"listed": "", "other": "", "coverage": ""}
+    for field in RECONCILED_FIELDS:
+        r = reconciliation[field]
+        cells["listed"] += f"<td>${r['listed']:,.0f}</td>"
+        cells["other"] += ('<td class="negative">-' if r["other"] < 0 else "<td>") + f"${abs(r['other']):,.0f}</td>"
+        cells["coverage"] += f"<td>{r['coverage']:.0f}%</td>"
+    return f'''
+            <tr style="border-top: 2px solid var(--border-color);">
+                <td style="text-align: left; color: var(--text-primary); font-weight: 600;">Listed accounts total</td>
+                {cells["listed"]}
+                <td colspan="2"></td>
+            </tr>
+            <tr>
+                <td style="text-align: left;">Other / unlisted accounts</td>
+                {cells["other"]}
+                <td colspan="2"></td>
+            </tr>
+            <tr>
+                <td style="text-align: left;">Share of territory revenue covered</td>
+                {cells["coverage"]}
+                <td colspan="2"></td>
+            </tr>
+        '''
+
+def analyze_accounts(agency_names):
+    """Concentration and churn analytics for every agency, from one pass over all accounts"""
+    columns = flatten_account_data(agency_names)
+    status = classify_accounts_batch(columns)["status"]
+    grouped = {agency: [] for agency in agency_names}
+    for row in zip(columns["agency"], columns["account"], columns["rev_2024"], columns["rev_2025"], status):
+        grouped[row[0]].append(row[1:])
+
+    analytics = {}
+    for agency, rows in grouped.items():
+        total_2024 = sum(rev_2024 for _, rev_2024, _, _ in rows)
+        total_2025 = sum(rev_2025 for _, _, rev_2025, _ in rows)
+        hhi = sum((rev_2025 / total_2025 * 100) ** 2 for _, _, rev_2025, _ in rows) if total_2025 > 0 else 0
+        top = heapq.nlargest(5, rows, key=lambda row: row[2])
+        churned = sorted((row for row in rows if row[1] > 0 and row[2] == 0), key=lambda row: -row[1])
+        # No 2024 revenue but some in 2025: listed accounts have earlier history, so these are reactivated
+        reactivated = sorted((row for row in rows if row[1] == 0 and row[2] > 0), key=lambda row: -row[2])
+        status_mix = dict.fromkeys((label for label, _ in ACCOUNT_STATUSES), 0)
+        for _, rev_2024, _, label in rows:
+            status_mix[label] += rev_2024 / total_2024 * 100 if total_2024 > 0 else 0
+        analytics[agency] = {
+            "account_count": len(rows),
+            "top": [name for name, _, _, _ in top],
+            "top5_share": sum(row[2] for row in top) / total_2025 * 100 if total_2025 > 0 else 0,
+            "hhi": hhi,
+            "effective_accounts": 10000 / hhi if hhi > 0 else 0,
+            "declining_top": [
+                name for name, _, _, label in heapq.nlargest(5, rows, key=lambda row: row[1])
+                if label in ("Declining", "At Risk")
+            ],
+            "churned": [name for name, _, _, _ in churned],
+            "churned_revenue": sum(row[1] for row in churned),
+            "reactivated": [name for name, _, _, _ in reactivated],
+            "reactivated_revenue": sum(row[2] for row in reactivated),
+            "status_mix": status_mix
+        }
+    return analytics
+
+def concentration_level(hhi):
+    """Label a Herfindahl index using the usual antitrust bands"""
+    return "High" if hhi > 2500 else "Moderate" if hhi >= 1500 else "Low"
+
+def build_recommendation_facts(agencies_data):
+    """Flatten each agency's metrics, peer ranks and account analytics into the facts rules refer to"""
+    def names(items, limit=3):
+        return ", ".join(items[:limit]) + (f" and {len(items) - limit} more" if len(items) > limit else "")
+
+    facts = {}
+    for agency, data in agencies_data.items():
+        metrics = data["metrics"]
+        accounts = metrics["account_analytics"]
+        peers = metrics.get("peers") or {"percentiles": {}, "growth_rank": None, "count": 1}
+        forecast = metrics.get("forecast")
+        facts[agency] = {
+            **{key: metrics[key] for key in ("rev_2025", "rev_2024", "yoy_change", "vs_ten_year", "trend")},
+            "forecast_change": (forecast["value"] - metrics["rev_2025"]) / metrics["rev_2025"] * 100
+                               if forecast and metrics["rev_2025"] > 0 else None,
+            **{f"{metric}_pct": peers["percentiles"].get(metric) if peers["count"] > 1 else None for metric in PEER_METRICS},
+            "growth_rank": peers["growth_rank"],
+            "peer_count": peers["count"],
+            "account_count": accounts["account_count"],
+            "top_names": names(accounts["top"]),
+            "top5_share": accounts["top5_share"],
+            "hhi": accounts["hhi"],
+            "declining_top_count": len(accounts["declining_top"]),
+            "declining_top_names": names(accounts["declining_top"]),
+            "churned_count": len(accounts["churned"]),
+            "churned_names": names(accounts["churned"]),
+            "churned_revenue": accounts["churned_revenue"],
+            "reactivated_count": len(accounts["reactivated"]),
+            "reactivated_names": names(accounts["reactivated"]),
+            "reactivated_revenue": accounts["reactivated_revenue"]
+        }
+    return facts
+
+def compile_rules(rules=None):
+    """Validate rules and resolve their operators once: [(rule, [(fact, test)])]"""
+    compiled = []
+    for rule in (RECOMMENDATION_RULES if rules is None else rules):
+        conditions = []
+        for fact, op, value in rule["when"]:
+            if op not in RULE_OPERATORS:
+                raise ValueError(f"Rule {rule['id']}: unknown operator {op!r}")
+            test = RULE_OPERATORS[op]
+            conditions.append((fact, lambda actual, test=test, value=value: actual is not None and test(actual, value)))
+        compiled.append((rule, conditions))
+    return compiled
+
+def evaluate_rules(facts, compiled):
+    """Apply compiled rules to every agency at once: {agency: [recommendation text]}"""
+    agencies = list(facts)
+    columns = {}
+    hits = {agency: [] for agency in agencies}
+    for rule, conditions in compiled:
+        mask = [True] * len(agencies)
+        for fact, test in conditions:
+            if fact not in columns:
+                columns[fact] = [facts[agency].get(fact) for agency in agencies]
+            mask = [matched and test(actual) for matched, actual in zip(mask, columns[fact])]
+        for agency, matched in zip(agencies, mask):
+            if matched:
+                hits[agency].append((rule["priority"], rule["text"].format(**facts[agency])))
+    return {agency: [text for _, text in sorted(found, key=lambda hit: hit[0])] for agency, found in hits.items()}
+
+def generate_recommendation_items(recommendations):
+    """Generate <li> items for the Recommendations list"""
+    return "\n".join(f'<li style="margin-bottom: 0.5rem;">{text}</li>' for text in recommendations)
+
 def generate_html_report(agency_name, metrics, token):
     """Generate HTML report for an agency"""
     territory = TERRITORIES.get(agency_name, "Unknown")
@@ -632,6 +1319,116 @@ def generate_html_report(agency_name, metrics, token):
     chart_labels = [str(y) for y in years]
     chart_data = [metrics["yearly_data"][y] / 1000 for y in years]  # In thousands
 
+    # Forecast overlay: projection line from the last actual year plus a confidence band
+    forecast = metrics.get("forecast")
+    forecast_stat = ""
+    forecast_datasets = ""
+    if forecast:
+        chart_labels.append(str(forecast["year"]))
+        padding = [None] * (len(years) - 1)
+        forecast_line = padding + [chart_data[-1], round(forecast["value"] / 1000)]
+        band_low = padding + [chart_data[-1], round(forecast["low"] / 1000)]
+        band_high = padding + [chart_data[-1], round(forecast["high"] / 1000)]
+        forecast_stat = f'''
+                <div class="stat-item">
+                    <div class="stat-label">{forecast["year"]} Forecast</div>
+                    <div class="stat-value">{format_currency(forecast["value"])}</div>
+                    <div class="stat-label">95% range {format_currency(forecast["low"])} - {format_currency(forecast["high"])}</div>
+                </div>'''
+        forecast_datasets = f''', {{
+                    label: '{forecast["year"]} Forecast',
+                    data: {json.dumps(forecast_line)},
+                    borderColor: '#8b5cf6',
+                    borderDash: [6, 4],
+                    fill: false,
+                    pointRadius: 4,
+                    pointBackgroundColor: '#8b5cf6'
+                }}, {{
+                    label: 'Forecast Low',
+                    data: {json.dumps(band_low)},
+                    borderColor: 'transparent',
+                    fill: false,
+                    pointRadius: 0
+                }}, {{
+                    label: 'Forecast Range (95%)',
+                    data: {json.dumps(band_high)},
+                    borderColor: 'transparent',
+                    backgroundColor: 'rgba(139, 92, 246, 0.15)',
+                    fill: '-1',
+                    pointRadius: 0
+                }}'''
+
+    # Peer benchmark: where the agency sits among all agencies on each peer metric
+    peers = metrics.get("peers")
+    peer_section = ""
+    if peers and peers["count"] > 1:
+        peer_items = "".join(f'''
+                <div class="stat-item">
+                    <div class="stat-label">{label}</div>
+                    <div class="stat-value {'positive' if peers["percentiles"][metric] >= 50 else 'negative'}">{ordinal(round(peers["percentiles"][metric]))} percentile</div>
+                </div>''' for metric, label in PEER_METRICS.items() if metric in peers["percentiles"])
+        peer_section = f'''
+        <div class="section">
+            <div class="section-title">Peer Benchmark</div>
+            <p style="color: var(--text-secondary); margin-bottom: 1rem; font-size: 0.875rem;">
+                Where your territory ranks among all {peers["count"]} BainUltra agencies. A higher percentile is better.
+            </p>
+            <div class="stats-row">
+                <div class="stat-item">
+                    <div class="stat-label">Growth Rank</div>
+                    <div class="stat-value">#{peers["growth_rank"]} of {peers["count"]}</div>
+                </div>{peer_items}
+            </div>
+        </div>
+'''
+
+    # Account concentration and churn, precomputed by analyze_accounts()
+    accounts = metrics.get("account_analytics")
+    concentration_section = ""
+    if accounts and accounts["account_count"]:
+        mix_colors = {"Growing": "var(--accent-green)", "At Risk": "#f97316", "Declining": "var(--accent-red)", "Stable": "var(--accent-yellow)"}
+        mix_bar = "".join(
+            f'<div style="width: {share:.2f}%; background: {mix_colors[label]};" title="{label}: {share:.0f}%"></div>'
+            for label, share in accounts["status_mix"].items() if share > 0
+        )
+        mix_legend = " | ".join(
+            f'<span class="{css_class}">{label} {accounts["status_mix"][label]:.0f}%</span>' for label, css_class in ACCOUNT_STATUSES
+        )
+        churn_lists = "".join(
+            f'''
+            <p style="color: var(--text-secondary); margin-top: 0.75rem; font-size: 0.875rem;"><strong style="color: var(--text-primary);">{title}:</strong> {", ".join(names)}</p>'''
+            for title, names in (("Churned (2024 revenue, none in 2025)", accounts["churned"]), ("Reactivated in 2025 (no 2024 revenue)", accounts["reactivated"])) if names
+        )
+        concentration_section = f'''
+        <div class="section">
+            <div class="section-title">Account Concentration &amp; Churn</div>
+            <div class="stats-row">
+                <div class="stat-item">
+                    <div class="stat-label">Top 5 Share of 2025</div>
+                    <div class="stat-value">{accounts["top5_share"]:.0f}%</div>
+                </div>
+                <div class="stat-item">
+                    <div class="stat-label">Herfindahl Index</div>
+                    <div class="stat-value">{accounts["hhi"]:,.0f}</div>
+                    <div class="stat-label">{concentration_level(accounts["hhi"])} concentration, like {accounts["effective_accounts"]:.1f} equal accounts</div>
+                </div>
+                <div class="stat-item">
+                    <div class="stat-label">Churned Accounts</div>
+                    <div class="stat-value {'negative' if accounts["churned"] else ''}">{len(accounts["churned"])}</div>
+                    <div class="stat-label">{format_currency(accounts["churned_revenue"])} of 2024 revenue</div>
+                </div>
+                <div class="stat-item">
+                    <div class="stat-label">Reactivated Accounts</div>
+                    <div class="stat-value {'positive' if accounts["reactivated"] else ''}">{len(accounts["reactivated"])}</div>
+                    <div class="stat-label">{format_currency(accounts["reactivated_revenue"])} of 2025 revenue</div>
+                </div>
+            </div>
+            <p style="color: var(--text-secondary); margin: 1.5rem 0 0.5rem; font-size: 0.875rem;">2024 revenue by account status</p>
+            <div style="display: flex; height: 12px; border-radius: 6px; overflow: hidden; background: var(--border-color);">{mix_bar}</div>
+            <p style="margin-top: 0.5rem; font-size: 0.75rem;">{mix_legend}</p>{churn_lists}
+        </div>
+'''
+
     html = f'''<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -879,10 +1676,10 @@ def generate_html_report(agency_name, metrics, token):
                 <div class="stat-item">
                     <div class="stat-label">Current vs Peak</div>
                     <div class="stat-value negative">{((metrics["rev_2025"] - metrics["covid_peak"]) / metrics["covid_peak"] * 100) if metrics["covid_peak"] > 0 else 0:.0f}%</div>
-                </div>
+                </div>{forecast_stat}
             </div>
         </div>
-
+{peer_section}
         <div class="section">
             <div class="section-title">Account Performance Details</div>
             <p style="color: var(--text-secondary); margin-bottom: 1rem; font-size: 0.875rem;">
@@ -902,19 +1699,17 @@ def generate_html_report(agency_name, metrics, token):
                     </thead>
                     <tbody>
                         {generate_account_rows(agency_name)}
+                        {generate_reconciliation_rows(metrics.get("reconciliation"))}
                     </tbody>
                 </table>
             </div>
         </div>
 
+{concentration_section}
         <div class="section">
             <div class="section-title">Recommendations</div>
             <ul style="color: var(--text-secondary); padding-left: 1.5rem;">
-                {'<li style="margin-bottom: 0.5rem;">Continue current strategy - territory is growing</li>' if metrics["trend"] == "growing" else ''}
-                {'<li style="margin-bottom: 0.5rem;">Focus on reactivating dormant accounts</li>' if metrics["trend"] == "declining" else ''}
-                <li style="margin-bottom: 0.5rem;">Q1 (Jan-Mar) is historically your strongest period - prepare promotional push</li>
-                <li style="margin-bottom: 0.5rem;">Review top 5 accounts for growth opportunities</li>
-                <li style="margin-bottom: 0.5rem;">Identify any churned accounts from 2023-2024 for win-back campaigns</li>
+                {generate_recommendation_items(metrics.get("recommendations", []))}
             </ul>
         </div>
 
@@ -942,12 +1737,12 @@ def generate_html_report(agency_name, metrics, token):
                     pointBackgroundColor: '#3b82f6'
                 }}, {{
                     label: '10-Year Average',
-                    data: Array({len(years)}).fill({metrics["ten_year_avg"]/1000:.0f}),
+                    data: Array({len(chart_labels)}).fill({metrics["ten_year_avg"]/1000:.0f}),
                     borderColor: '#94a3b8',
                     borderDash: [5, 5],
                     fill: false,
                     pointRadius: 0
-                }}]
+                }}{forecast_datasets}]
             }},
             options: {{
                 responsive: true,
@@ -956,7 +1751,7 @@ def generate_html_report(agency_name, metrics, token):
                 plugins: {{
                     legend: {{
                         position: 'top',
-                        labels: {{ color: '#94a3b8' }}
+                        labels: {{ color: '#94a3b8', filter: item => item.text !== 'Forecast Low' }}
                     }},
                     tooltip: {{
                         callbacks: {{
@@ -989,20 +1784,347 @@ def generate_html_report(agency_name, metrics, token):
 
     return html
 
-def generate_index_page(agencies_data):
-    """Generate internal index page with all agency links"""
-    rows = ""
-    for agency, data in sorted(agencies_data.items(), key=lambda x: x[1]["metrics"]["rev_2025"], reverse=True):
-        metrics = data["metrics"]
-        trend_class = "positive" if metrics["trend"] == "growing" else "negative" if metrics["trend"] == "declining" else "neutral"
-        rows += f'''
-            <tr>
+def pdf_text_width(text, size):
+    """Approximate width of text set in Helvetica at the given size, in points"""
+    return sum(HELVETICA_WIDTHS[ord(c) - 32] if 32 <= ord(c) <= 126 else 556 for c in text) * size / 1000
+
+def pdf_wrap_text(text, size, width):
+    """Break text into lines that fit within width points"""
+    lines, current = [], ""
+    for word in text.split():
+        candidate = f"{current} {word}".strip()
+        if current and pdf_text_width(candidate, size) > width:
+            lines.append(current)
+            candidate = word
+        current = candidate
+    return lines + [current] if current else lines
+
+def pdf_fit_text(text, size, width):
+    """Truncate text with '...' so it fits within width points"""
+    if pdf_text_width(text, size) <= width:
+        return text
+    while text and pdf_text_width(text + "...", size) > width:
+        text = text[:-1]
+    return text.rstrip() + "..."
+
+class PdfDocument:
+    """Minimal PDF writer: Helvetica text, lines and filled rectangles, positioned from the top-left"""
+
+    def __init__(self, size=PDF_PAGE_SIZE):
+        self.width, self.height = size
+        self.pages = []
+
+    def new_page(self):
+        self.pages.append([])
+
+    def _ops(self, *ops):
+        self.pages[-1].extend(ops)
+
+    def text(self, x, y, text, size=10, bold=False, color=PDF_COLORS["text"], align="left"):
+        if align != "left":
+            width = pdf_text_width(text, size) * (1.05 if bold else 1)
+            x -= width if align == "right" else width / 2
+        data = text.encode("cp1252", "replace").replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+        self._ops(
+            "%.3f %.3f %.3f rg BT /F%d %.1f Tf %.2f %.2f Td (" % (*color, 2 if bold else 1, size, x, self.height - y),
+            data.decode("latin-1"), ") Tj ET\n"
+        )
+
+    def rect(self, x, y, width, height, fill=None, stroke=None, line_width=0.5):
+        ops = []
+        if fill:
+            ops.append("%.3f %.3f %.3f rg" % fill)
+        if stroke:
+            ops.append("%.3f %.3f %.3f RG %.2f w" % (*stroke, line_width))
+        paint = "B" if fill and stroke else "f" if fill else "S"
+        self._ops(" ".join(ops) + " %.2f %.2f %.2f %.2f re %s\n" % (x, self.height - y - height, width, height, paint))
+
+    def line(self, points, color=PDF_COLORS["rule"], width=0.5, dash=None):
+        path = " ".join(
+            "%.2f %.2f %s" % (x, self.height - y, "m" if i == 0 else "l") for i, (x, y) in enumerate(points)
+        )
+        dash_op = "[%s] 0 d" % " ".join(map(str, dash)) if dash else "[] 0 d"
+        self._ops("%.3f %.3f %.3f RG %.2f w %s %s S\n" % (*color, width, dash_op, path))
+
+    def to_bytes(self):
+        """Serialize the document: catalog, page tree, two fonts, then each page and its content"""
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            None,
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"
+        ]
+        page_refs = []
+        for ops in self.pages:
+            content = zlib.compress("".join(ops).encode("latin-1"))
+            objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(content) + content + b"\nendstream")
+            objects.append((
+                "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+                "/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>" % (self.width, self.height, len(objects))
+            ).encode("ascii"))
+            page_refs.append(f"{len(objects)} 0 R")
+        objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(page_refs)} >>".encode("ascii")
+
+        out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+        xref = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+        return bytes(out)
+
+def nice_axis_step(max_value, ticks=5):
+    """Round axis step (1, 2 or 5 x 10^n) giving about `ticks` gridlines up to max_value"""
+    raw = max(max_value, 1) / ticks
+    magnitude = 10 ** math.floor(math.log10(raw))
+    return next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw)
+
+def draw_revenue_chart(pdf, x, y, width, height, yearly_data, forecast=None):
+    """Draw yearly revenue bars (plus the forecast and its 95% range) into a box on the current page"""
+    years = sorted(yearly_data)
+    bars = [(str(year), yearly_data[year], PDF_COLORS["bar"]) for year in years]
+    if forecast:
+        bars.append((f"{forecast['year']}F", forecast["value"], PDF_COLORS["forecast"]))
+    top = max([value for _, value, _ in bars] + [forecast["high"] if forecast else 0])
+    step = nice_axis_step(top)
+    axis_max = step * math.ceil(top / step) or step
+
+    plot_x, plot_width = x + 44, width - 44
+    plot_height = height - 18
+    baseline = y + plot_height
+    scale = plot_height / axis_max
+    for i in range(int(round(axis_max / step)) + 1):
+        tick_y = baseline - i * step * scale
+        pdf.line([(plot_x, tick_y), (plot_x + plot_width, tick_y)], width=0.3 if i else 0.8)
+        pdf.text(plot_x - 6, tick_y + 3, format_currency(i * step), size=7, color=PDF_COLORS["muted"], align="right")
+
+    slot = plot_width / len(bars)
+    for i, (label, value, color) in enumerate(bars):
+        bar_x = plot_x + i * slot + slot * 0.18
+        bar_height = value * scale
+        pdf.rect(bar_x, baseline - bar_height, slot * 0.64, bar_height, fill=color)
+        pdf.text(bar_x + slot * 0.32, baseline + 11, label, size=7, color=PDF_COLORS["muted"], align="center")
+    if forecast:
+        whisker_x = plot_x + (len(bars) - 0.5) * slot
+        low, high = baseline - forecast["low"] * scale, baseline - forecast["high"] * scale
+        pdf.line([(whisker_x, low), (whisker_x, high)], color=PDF_COLORS["text"], width=0.8)
+        for end in (low, high):
+            pdf.line([(whisker_x - 4, end), (whisker_x + 4, end)], color=PDF_COLORS["text"], width=0.8)
+
+def generate_pdf_report(agency_name, metrics, token, territory="Unknown", accounts=None):
+    """Generate print-ready PDF report for an agency"""
+    accounts = accounts or {}
+    pdf = PdfDocument()
+    left, right = PDF_MARGIN, pdf.width - PDF_MARGIN
+    content_width = right - left
+
+    def change_color(value):
+        return PDF_COLORS["positive"] if value > 0 else PDF_COLORS["negative"] if value < -5 else PDF_COLORS["neutral"]
+
+    # Page 1: headline metrics, revenue chart and key insights
+    pdf.new_page()
+    pdf.text(left, 60, f"CONFIDENTIAL - For {agency_name} internal use only", size=8, color=PDF_COLORS["negative"])
+    pdf.text(left, 90, agency_name, size=22, bold=True)
+    pdf.text(left, 108, f"Territory: {territory}", size=10, color=PDF_COLORS["muted"])
+    pdf.text(right, 108, f"Report Generated: {datetime.now().strftime('%B %d, %Y')}", size=10, color=PDF_COLORS["muted"], align="right")
+    pdf.line([(left, 120), (right, 120)], width=1)
+
+    trend_colors = {"growing": PDF_COLORS["positive"], "declining": PDF_COLORS["negative"]}
+    cards = [
+        ("2025 Revenue", format_currency(metrics["rev_2025"]), PDF_COLORS["text"], "CY2025 (through Dec 23)"),
+        ("vs 2024", f"{metrics['yoy_change']:+.1f}%", change_color(metrics["yoy_change"]),
+         f"{format_currency(abs(metrics['rev_2025'] - metrics['rev_2024']))} {'more' if metrics['yoy_change'] > 0 else 'less'}"),
+        ("vs 10-Year Avg", f"{metrics['vs_ten_year']:+.1f}%", change_color(metrics["vs_ten_year"]),
+         f"Avg: {format_currency(metrics['ten_year_avg'])}"),
+        ("Trend", metrics["trend"].upper(), trend_colors.get(metrics["trend"], PDF_COLORS["neutral"]), "Based on 3-year pattern")
+    ]
+    card_width = (content_width - 3 * 10) / 4
+    for i, (label, value, color, subtext) in enumerate(cards):
+        card_x = left + i * (card_width + 10)
+        pdf.rect(card_x, 136, card_width, 70, fill=PDF_COLORS["panel"])
+        pdf.text(card_x + 10, 154, label.upper(), size=7, color=PDF_COLORS["muted"])
+        pdf.text(card_x + 10, 180, value, size=18, bold=True, color=color)
+        pdf.text(card_x + 10, 197, subtext, size=7, color=PDF_COLORS["muted"])
+
+    pdf.text(left, 236, "10-Year Revenue Trend", size=12, bold=True)
+    draw_revenue_chart(pdf, left, 250, content_width, 230, metrics["yearly_data"], metrics.get("forecast"))
+
+    pdf.text(left, 530, "Key Insights", size=12, bold=True)
+    context = (
+        "Your territory is performing above the 10-year average." if metrics["vs_ten_year"] > 0 else
+        "Your territory has returned to pre-COVID baseline levels." if metrics["vs_ten_year"] > -15 else
+        "Your territory is significantly below historical averages - investigation needed."
+    )
+    pdf.text(left, 550, context, size=10)
+    vs_peak = ((metrics["rev_2025"] - metrics["covid_peak"]) / metrics["covid_peak"] * 100) if metrics["covid_peak"] > 0 else 0
+    stats = [
+        ("Pre-COVID Avg (2015-2019)", format_currency(metrics["pre_covid_avg"])),
+        ("COVID Peak (2021-22)", format_currency(metrics["covid_peak"])),
+        ("Current vs Peak", f"{vs_peak:.0f}%")
+    ]
+    forecast = metrics.get("forecast")
+    if forecast:
+        stats.append((f"{forecast['year']} Forecast (95% range {format_currency(forecast['low'])} - {format_currency(forecast['high'])})",
+                      format_currency(forecast["value"])))
+    for i, (label, value) in enumerate(stats):
+        stat_y = 574 + i * 22
+        pdf.text(left, stat_y, label, size=9, color=PDF_COLORS["muted"])
+        pdf.text(right, stat_y, value, size=11, bold=True, align="right")
+        pdf.line([(left, stat_y + 7), (right, stat_y + 7)], width=0.3)
+
+    peers = metrics.get("peers")
+    if peers and peers["count"] > 1:
+        pdf.text(left, 680, f"Peer Benchmark (among {peers['count']} agencies)", size=12, bold=True)
+        peer_stats = [("Growth Rank", f"#{peers['growth_rank']} of {peers['count']}", PDF_COLORS["text"])] + [
+            (label, f"{ordinal(round(peers['percentiles'][metric]))} pct",
+             PDF_COLORS["positive"] if peers["percentiles"][metric] >= 50 else PDF_COLORS["negative"])
+            for metric, label in PEER_METRICS.items() if metric in peers["percentiles"]
+        ]
+        peer_width = content_width / len(peer_stats)
+        for i, (label, value, color) in enumerate(peer_stats):
+            pdf.text(left + i * peer_width, 700, label, size=8, color=PDF_COLORS["muted"])
+            pdf.text(left + i * peer_width, 718, value, size=13, bold=True, color=color)
+
+    # Following pages: the account table, repeating its header on each page
+    status_colors = {"Growing": "positive", "At Risk": "at_risk", "Declining": "negative", "Stable": "neutral"}
+    columns = [("Account", left, "left"), ("10-Year Avg", left + 300, "right"), ("2024", left + 360, "right"),
+               ("2025", left + 420, "right"), ("vs 2024", left + 465, "right"), ("Status", left + 475, "left")]
+    rows = []
+    for name, data in sorted(accounts.items(), key=lambda item: item[1].get("rev_2025", 0), reverse=True):
+        yoy, status, _ = classify_account(data)
+        rows.append(([name, f"${data.get('ten_year_avg', 0):,.0f}", f"${data.get('rev_2024', 0):,.0f}",
+                      f"${data.get('rev_2025', 0):,.0f}", f"{yoy:+.0f}%", status], PDF_COLORS[status_colors[status]], False))
+    reconciliation = metrics.get("reconciliation")
+    if reconciliation and any(r["listed"] for r in reconciliation.values()):
+        for label, key in (("Listed accounts total", "listed"), ("Other / unlisted accounts", "other")):
+            cells = [f"{'-' if reconciliation[f][key] < 0 else ''}${abs(reconciliation[f][key]):,.0f}" for f in RECONCILED_FIELDS]
+            rows.append(([label] + cells + ["", ""], PDF_COLORS["text"], key == "listed"))
+        rows.append((["Share of territory revenue covered"] + [f"{reconciliation[f]['coverage']:.0f}%" for f in RECONCILED_FIELDS] + ["", ""],
+                     PDF_COLORS["text"], False))
+
+    row_height, table_top = 16, 90
+    rows_per_page = int((pdf.height - table_top - 90) // row_height)
+    for start in range(0, max(len(rows), 1), rows_per_page):
+        pdf.new_page()
+        pdf.text(left, 60, "Account Performance Details" + (" (continued)" if start else ""), size=12, bold=True)
+        for label, x, align in columns:
+            pdf.text(x, table_top - 6, label.upper(), size=7, bold=True, color=PDF_COLORS["muted"], align=align)
+        pdf.line([(left, table_top), (right, table_top)], width=0.8)
+        if not rows:
+            pdf.text(left, table_top + 14, "No account data available", size=9, color=PDF_COLORS["muted"])
+        for i, (cells, status_color, emphasize) in enumerate(rows[start:start + rows_per_page]):
+            row_y = table_top + (i + 1) * row_height
+            if emphasize:
+                pdf.line([(left, row_y - 12), (right, row_y - 12)], width=1)
+            for col, ((_, x, align), cell) in enumerate(zip(columns, cells)):
+                text = pdf_fit_text(cell, 8.5, 240) if col == 0 else cell
+                color = status_color if col == 5 else PDF_COLORS["text"]
+                pdf.text(x, row_y - 1, text, size=8.5, bold=emphasize or col == 3, color=color, align=align)
+            pdf.line([(left, row_y + 4), (right, row_y + 4)], width=0.3)
+
+    # Concentration/churn and recommendations follow the table, each on a new page if it doesn't fit
+    block_y = table_top + (len(rows[start:start + rows_per_page]) + 1) * row_height + 36
+    accounts = metrics.get("account_analytics")
+    if accounts and accounts["account_count"]:
+        mix = ", ".join(f"{label} {share:.0f}%" for label, share in accounts["status_mix"].items())
+        concentration = [
+            ("Top 5 share of listed 2025 revenue", f"{accounts['top5_share']:.0f}%"),
+            (f"Herfindahl index ({concentration_level(accounts['hhi'])} concentration, like "
+             f"{accounts['effective_accounts']:.1f} equal accounts)", f"{accounts['hhi']:,.0f}"),
+            (f"Churned accounts ({format_currency(accounts['churned_revenue'])} of 2024 revenue)", str(len(accounts["churned"]))),
+            (f"Reactivated accounts ({format_currency(accounts['reactivated_revenue'])} of 2025 revenue)", str(len(accounts["reactivated"]))),
+            (f"2024 revenue by status: {mix}", "")
+        ]
+        if block_y + 22 + len(concentration) * 18 > pdf.height - 60:
+            pdf.new_page()
+            block_y = 60
+        pdf.text(left, block_y, "Account Concentration & Churn", size=12, bold=True)
+        block_y += 22
+        for label, value in concentration:
+            pdf.text(left, block_y, label, size=9, color=PDF_COLORS["muted"])
+            pdf.text(right, block_y, value, size=10, bold=True, align="right")
+            pdf.line([(left, block_y + 6), (right, block_y + 6)], width=0.3)
+            block_y += 18
+        block_y += 24
+
+    recommendations = metrics.get("recommendations", [])
+    if recommendations:
+        lines = [pdf_wrap_text(text, 9.5, content_width - 14) for text in recommendations]
+        rec_y = block_y
+        if rec_y + 20 + sum(len(wrapped) * 13 + 6 for wrapped in lines) > pdf.height - 60:
+            pdf.new_page()
+            rec_y = 60
+        pdf.text(left, rec_y, "Recommendations", size=12, bold=True)
+        rec_y += 22
+        for wrapped in lines:
+            pdf.text(left, rec_y, "-", size=9.5)
+            for line_text in wrapped:
+                pdf.text(left + 14, rec_y, line_text, size=9.5)
+                rec_y += 13
+            rec_y += 6
+
+    # Footer on every page, now that the page count is known
+    pages = pdf.pages
+    for number in range(len(pages)):
+        pdf.pages = pages[:number + 1]
+        pdf.text(left, pdf.height - 30, f"BainUltra Agency Intelligence Report | Report ID: {token}", size=7, color=PDF_COLORS["muted"])
+        pdf.text(right, pdf.height - 30, f"Page {number + 1} of {len(pages)}", size=7, color=PDF_COLORS["muted"], align="right")
+    pdf.pages = pages
+    return pdf.to_bytes()
+
+def render_pdf_job(job):
+    """Worker entry point: (agency, metrics, token, territory, accounts) -> (token, PDF bytes)"""
+    agency_name, metrics, token, territory, accounts = job
+    return token, generate_pdf_report(agency_name, metrics, token, territory, accounts)
+
+def write_pdf_reports(backend, agencies_data, workers=None):
+    """Render PDF reports for {agency: data} in parallel worker processes and write agency-reports/<token>.pdf"""
+    jobs = [
+        (agency_name, data["metrics"], data["token"], TERRITORIES.get(agency_name, "Unknown"), ACCOUNT_DATA.get(agency_name, {}))
+        for agency_name, data in agencies_data.items()
+    ]
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        for token, data in map(render_pdf_job, jobs):
+            backend.write_bytes(f"{REPORTS_DIR}/{token}.pdf", data)
+        return len(jobs)
+    # The pool is shut down even if a worker or a write fails, so --watch doesn't leak processes
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        for token, data in pool.map(render_pdf_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))):
+            backend.write_bytes(f"{REPORTS_DIR}/{token}.pdf", data)
+    return len(jobs)
+
+def generate_index_row(agency, data):
+    """Generate one internal index row, tagged with its token so it can be patched in place"""
+    metrics = data["metrics"]
+    trend_class = "positive" if metrics["trend"] == "growing" else "negative" if metrics["trend"] == "declining" else "neutral"
+    return f'''
+            <tr data-token="{data["token"]}" data-rev="{metrics["rev_2025"]}">
                 <td><strong>{agency}</strong><br><span style="color: var(--text-muted); font-size: 0.75rem;">{data["territory"]}</span></td>
                 <td>{format_currency(metrics["rev_2025"])}</td>
                 <td class="{trend_class}">{metrics["yoy_change"]:+.1f}%</td>
                 <td><a href="{data["token"]}.html" style="color: var(--accent-blue);">View Report</a></td>
             </tr>'''
 
+def patch_index_row(html, agency, data):
+    """Replace one agency's row in an existing index page, at its place in the 2025 revenue order"""
+    row = generate_index_row(agency, data)
+    html = re.sub(r'\s*<tr data-token="%s"[^>]*>.*?</tr>' % re.escape(data["token"]), "", html, count=1, flags=re.S)
+    # Rows are sorted by 2025 revenue, highest first, as in generate_index_page()
+    for match in re.finditer(r'\s*<tr data-token="[^"]*" data-rev="([^"]*)">', html):
+        if float(match.group(1)) < data["metrics"]["rev_2025"]:
+            return html[:match.start()] + row + html[match.start():]
+    return re.sub(r"\s*</tbody>", lambda m: row + m.group(0), html, count=1)
+
+def generate_index_page(agencies_data):
+    """Generate internal index page with all agency links"""
+    rows = ""
+    for agency, data in sorted(agencies_data.items(), key=lambda x: x[1]["metrics"]["rev_2025"], reverse=True):
+        rows += generate_index_row(agency, data)
+
     html = f'''<!DOCTYPE html>
 <html lang="en">
 <head>
@@ -1069,6 +2191,7 @@ def generate_index_page(agencies_data):
         <div class="warning">
             <strong>INTERNAL USE ONLY</strong> - Do not share this page. Each agency report has a unique secret URL.
         </div>
+        <p style="margin-bottom: 2rem;"><a href="at-risk.html" style="color: var(--accent-blue);">Company-wide at-risk accounts</a> (<a href="at-risk.csv" style="color: var(--accent-blue);">CSV</a>) | <a href="regions/index.html" style="color: var(--accent-blue);">Territory rollups</a> | <a href="validation.html" style="color: var(--accent-blue);">Data validation</a> | <a href="changes.html" style="color: var(--accent-blue);">Changes since last run</a></p>
         <table>
             <thead>
                 <tr>
@@ -1090,50 +2213,2415 @@ def generate_index_page(agencies_data):
 </html>'''
     return html
 
-def main():
-    output_dir = Path("/Users/jm/powerhouse/salesforce-dashboard/ceo-dashboard/sales-analysis-presentation/agency-reports")
-    output_dir.mkdir(exist_ok=True)
+def validate_dataset(yearly_data=None, account_data=None, thresholds=None):
+    """Check the source data for gaps, outliers and inconsistencies before rendering"""
+    yearly_data = AGENCY_YEARLY_DATA if yearly_data is None else yearly_data
+    account_data = ACCOUNT_DATA if account_data is None else account_data
+    thresholds = thresholds or VALIDATION_THRESHOLDS
+    issues = []
 
-    agencies_data = {}
+    def flag(severity, check, agency, detail):
+        issues.append({"severity": severity, "check": check, "agency": agency, "detail": detail})
 
-    # Process each agency
-    for agency_name, yearly_data in AGENCY_YEARLY_DATA.items():
-        # Skip agencies with minimal data
-        if sum(yearly_data.values()) < 50000:
+    # Missing years and zero gaps; calculate_metrics() averages only nonzero years
+    for agency, series in yearly_data.items():
+        missing = [year for year in EXPECTED_YEARS if year not in series]
+        if missing:
+            flag("warning", "missing_year", agency, f"No data for {', '.join(map(str, missing))}")
+        values = [series.get(year, 0) for year in EXPECTED_YEARS]
+        active = [i for i, value in enumerate(values) if value > 0]
+        if not active:
+            flag("warning", "no_revenue", agency, "No revenue in any year")
             continue
+        leading = [EXPECTED_YEARS[i] for i in range(active[0]) if EXPECTED_YEARS[i] in series]
+        gaps = [EXPECTED_YEARS[i] for i in range(active[0], active[-1]) if values[i] == 0]
+        if leading:
+            flag("info", "late_start", agency, f"No revenue before {EXPECTED_YEARS[active[0]]}; averages use {len(active)} nonzero years")
+        for year in gaps:
+            averages = [name for name, years in (("10-year", range(2015, 2025)), ("pre-COVID", range(2015, 2020))) if year in years]
+            if averages:
+                flag("warning", "zero_gap", agency, f"Zero revenue in {year} is excluded from the {' and '.join(averages)} average")
 
-        token = generate_token(agency_name)
-        metrics = calculate_metrics(agency_name, yearly_data)
-        territory = TERRITORIES.get(agency_name, "Unknown")
-
-        agencies_data[agency_name] = {
-            "token": token,
-            "territory": territory,
-            "metrics": metrics
-        }
-
-        # Generate HTML report
-        html = generate_html_report(agency_name, metrics, token)
+    # Year-over-year jumps: robust z-score of log ratios across every agency-year
+    pairs = [
+        (agency, year, math.log(series[year] / series[year - 1]))
+        for agency, series in yearly_data.items()
+        for year in sorted(series)
+        if series.get(year - 1, 0) > 0 and series[year] > 0
+    ]
+    if len(pairs) >= 3:
+        log_ratios = [ratio for _, _, ratio in pairs]
+        median = statistics.median(log_ratios)
+        mad = statistics.median(abs(r - median) for r in log_ratios) or 1e-9
+        for (agency, year, ratio) in pairs:
+            score = 0.6745 * (ratio - median) / mad
+            if abs(score) > thresholds["yoy_robust_z"]:
+                flag("warning", "yoy_outlier", agency,
+                     f"{year - 1}->{year} changed {math.exp(ratio) * 100 - 100:+.0f}% (robust z {score:+.1f})")
 
-        # Write to file
-        output_file = output_dir / f"{token}.html"
-        with open(output_file, "w") as f:
-            f.write(html)
+    # Account-level checks over flattened columns
+    columns = flatten_account_data(account_data=account_data)
+    spike = thresholds["account_spike_ratio"]
+    for agency, name, avg, rev_2024 in zip(columns["agency"], columns["account"], columns["ten_year_avg"], columns["rev_2024"]):
+        if avg > 0 and rev_2024 > avg * spike:
+            flag("warning", "account_spike", agency, f"{name}: 2024 revenue ${rev_2024:,.0f} is {rev_2024 / avg:.1f}x its 10-year avg ${avg:,.0f}")
+        if name.endswith("..."):
+            flag("info", "truncated_name", agency, f"{name}: account name is truncated")
 
-        print(f"Generated: {agency_name} -> {token}.html")
+    # Listed accounts are a subset of the agency, so their sum must not exceed its total
+    account_sums = {}
+    for agency, rev_2024, rev_2025 in zip(columns["agency"], columns["rev_2024"], columns["rev_2025"]):
+        sums = account_sums.setdefault(agency, {2024: 0, 2025: 0})
+        sums[2024] += rev_2024
+        sums[2025] += rev_2025
+    for agency, sums in account_sums.items():
+        for year, total in sums.items():
+            agency_total = yearly_data.get(agency, {}).get(year)
+            if agency_total is None:
+                flag("error", "account_total_mismatch", agency, f"Accounts listed but no {year} agency total")
+            elif total > agency_total * (1 + thresholds["account_total_tolerance"]):
+                flag("error", "account_total_mismatch", agency,
+                     f"{year} account sum ${total:,.0f} exceeds agency total ${agency_total:,.0f} by ${total - agency_total:,.0f}")
 
-    # Generate index page
-    index_html = generate_index_page(agencies_data)
-    with open(output_dir / "index.html", "w") as f:
-        f.write(index_html)
+    order = {"error": 0, "warning": 1, "info": 2}
+    issues.sort(key=lambda issue: (order[issue["severity"]], issue["check"], issue["agency"]))
+    return issues
 
-    print(f"\nGenerated {len(agencies_data)} agency reports")
-    print(f"Index page: {output_dir}/_index.html")
+def generate_validation_page(issues):
+    """Generate internal data validation report"""
+    counts = {severity: sum(1 for i in issues if i["severity"] == severity) for severity in ("error", "warning", "info")}
+    rows = ""
+    for issue in issues:
+        rows += f'''
+            <tr>
+                <td class="{issue["severity"]}">{issue["severity"].upper()}</td>
+                <td>{issue["check"]}</td>
+                <td><strong>{issue["agency"]}</strong></td>
+                <td>{issue["detail"]}</td>
+            </tr>'''
 
-    # Print URL mapping
-    print("\n=== Agency URL Mapping ===")
-    for agency, data in sorted(agencies_data.items()):
-        print(f"{agency}: {data['token']}.html")
+    html = f'''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>BainUltra | Data Validation (Internal)</title>
+    <style>
+        :root {{
+            --bg-dark: #0a0a0f;
+            --bg-card: #12121a;
+            --accent-red: #ef4444;
+            --accent-yellow: #eab308;
+            --accent-blue: #3b82f6;
+            --text-primary: #ffffff;
+            --text-secondary: #94a3b8;
+            --text-muted: #64748b;
+            --border-color: #1e293b;
+        }}
+        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
+        body {{
+            font-family: -apple-system, sans-serif;
+            background: var(--bg-dark);
+            color: var(--text-primary);
+            padding: 2rem;
+        }}
+        .container {{ max-width: 1200px; margin: 0 auto; }}
+        h1 {{ margin-bottom: 1rem; }}
+        .summary {{ color: var(--text-secondary); margin-bottom: 2rem; }}
+        table {{
+            width: 100%;
+            border-collapse: collapse;
+            background: var(--bg-card);
+            border-radius: 12px;
+            overflow: hidden;
+            font-size: 0.875rem;
+        }}
+        th, td {{
+            padding: 0.75rem 1rem;
+            text-align: left;
+            border-bottom: 1px solid var(--border-color);
+            color: var(--text-secondary);
+        }}
+        th {{
+            background: rgba(59,130,246,0.1);
+            font-size: 0.75rem;
+            text-transform: uppercase;
+            letter-spacing: 0.05em;
+        }}
+        td strong {{ color: var(--text-primary); }}
+        .error {{ color: var(--accent-red); font-weight: 600; }}
+        .warning {{ color: var(--accent-yellow); }}
+        .info {{ color: var(--accent-blue); }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>Data Validation</h1>
+        <p class="summary">{counts["error"]} errors, {counts["warning"]} warnings, {counts["info"]} notes in the source data.</p>
+        <table>
+            <thead>
+                <tr>
+                    <th>Severity</th>
+                    <th>Check</th>
+                    <th>Agency</th>
+                    <th>Detail</th>
+                </tr>
+            </thead>
+            <tbody>
+                {rows}
+            </tbody>
+        </table>
+        <p style="color: var(--text-muted); margin-top: 2rem; font-size: 0.875rem;">
+            Generated: {datetime.now().strftime('%B %d, %Y at %H:%M')}
+        </p>
+    </div>
+</body>
+</html>'''
+    return html
+
+def build_diff_state(agencies_data, render_key=""):
+    """Summarize every agency's inputs for comparison with the next run"""
+    columns = flatten_account_data(agencies_data.keys())
+    status = classify_accounts_batch(columns)["status"]
+    accounts = {agency: {} for agency in agencies_data}
+    for agency, name, label, rev_2025 in zip(columns["agency"], columns["account"], status, columns["rev_2025"]):
+        accounts[agency][name] = [label, rev_2025]
+
+    agencies = {}
+    for agency_name, data in agencies_data.items():
+        metrics = data["metrics"]
+        accounts_data = ACCOUNT_DATA.get(agency_name, {})
+        # Peer ranks and the recommendations drawn from them move with other agencies' data
+        own_metrics = {key: value for key, value in metrics.items() if key not in ("peers", "recommendations")}
+        own = json.dumps([agency_name, data["territory"], own_metrics, accounts_data], sort_keys=True, default=str)
+        rendered = json.dumps([agency_name, data, accounts_data], sort_keys=True, default=str)
+        agencies[data["token"]] = {
+            "agency": agency_name,
+            "input_digest": hashlib.sha256(own.encode("utf-8")).hexdigest()[:16],
+            "digest": hashlib.sha256(rendered.encode("utf-8")).hexdigest()[:16],
+            "rev_2024": metrics["rev_2024"],
+            "rev_2025": metrics["rev_2025"],
+            "trend": metrics["trend"],
+            "peer_values": peer_values(metrics),
+            "accounts": accounts[agency_name]
+        }
+    return {"generated": datetime.now().isoformat(timespec="seconds"), "render_key": render_key, "agencies": agencies}
+
+def load_diff_state(backend, path=DIFF_STATE_PATH):
+    """The state saved by the previous run to this destination, or an empty state"""
+    text = backend.read_text(path)
+    try:
+        return json.loads(text) if text else {}
+    except ValueError:
+        return {}
+
+def diff_agency_states(previous, current):
+    """Compare two {token: agency state} maps and return {token: change} for agencies whose own data differs"""
+    changes = {}
+    for token, state in current.items():
+        prior = previous.get(token)
+        if prior is not None and prior.get("input_digest") == state["input_digest"]:
+            continue
+        prior = prior or {"rev_2024": 0, "rev_2025": 0, "trend": None, "accounts": {}}
+        old_accounts, new_accounts = prior["accounts"], state["accounts"]
+        changes[token] = {
+            "agency": state["agency"],
+            "kind": "changed" if token in previous else "new",
+            "revenue": {
+                field: (prior[field], state[field])
+                for field in ("rev_2024", "rev_2025") if prior[field] != state[field]
+            },
+            "trend": (prior["trend"], state["trend"]) if prior["trend"] != state["trend"] else None,
+            "status_changes": [
+                (name, old_accounts[name][0], values[0])
+                for name, values in new_accounts.items()
+                if name in old_accounts and old_accounts[name][0] != values[0]
+            ],
+            "account_changes": [
+                (name, old_accounts[name][1], values[1])
+                for name, values in new_accounts.items()
+                if name in old_accounts and old_accounts[name][1] != values[1]
+            ],
+            "new_accounts": [name for name in new_accounts if name not in old_accounts],
+            "lost_accounts": [name for name in old_accounts if name not in new_accounts]
+        }
+    for token, state in previous.items():
+        if token not in current:
+            changes[token] = {
+                "agency": state["agency"], "kind": "removed", "revenue": {}, "trend": None,
+                "status_changes": [], "account_changes": [], "new_accounts": [],
+                "lost_accounts": list(state["accounts"])
+            }
+    return changes
+
+def describe_change(change):
+    """One-line summary of an agency's change, e.g. for notifications"""
+    if change["kind"] == "removed":
+        return "No longer reported"
+    if change["kind"] == "new":
+        return f"New agency, 2025 revenue {format_currency(change['revenue'].get('rev_2025', (0, 0))[1])}"
+    parts = []
+    for field, (old, new) in change["revenue"].items():
+        parts.append(f"{field.replace('rev_', '')} revenue {format_currency(old)} -> {format_currency(new)} ({format_signed_currency(new - old)})")
+    if change["trend"]:
+        parts.append(f"trend {change['trend'][0]} -> {change['trend'][1]}")
+    if change["status_changes"]:
+        parts.append(f"{len(change['status_changes'])} account status changes")
+    if change["account_changes"]:
+        parts.append(f"{len(change['account_changes'])} account revenue changes")
+    if change["new_accounts"]:
+        parts.append(f"{len(change['new_accounts'])} new accounts")
+    if change["lost_accounts"]:
+        parts.append(f"{len(change['lost_accounts'])} accounts no longer listed")
+    return "; ".join(parts) or "Report inputs changed"
+
+def generate_changes_page(changes, previous_generated=None):
+    """Generate internal report of what changed for each agency since the last run"""
+    kinds = {"new": 0, "changed": 1, "removed": 2}
+    rows = ""
+    for token, change in sorted(changes.items(), key=lambda item: (kinds[item[1]["kind"]], item[1]["agency"])):
+        details = "".join(
+            f"<li>{name}: {old} &rarr; {new}</li>" for name, old, new in change["status_changes"]
+        ) + "".join(
+            f"<li>{name}: 2025 revenue {format_currency(old)} &rarr; {format_currency(new)} ({format_signed_currency(new - old)})</li>"
+            for name, old, new in change["account_changes"]
+        ) + "".join(
+            f"<li>{name}: new account</li>" for name in change["new_accounts"] if change["kind"] == "changed"
+        ) + "".join(
+            f"<li>{name}: no longer listed</li>" for name in change["lost_accounts"] if change["kind"] == "changed"
+        )
+        link = change["agency"] if change["kind"] == "removed" else f'<a href="{token}.html">{change["agency"]}</a>'
+        rows += f'''
+            <tr>
+                <td class="{change["kind"]}">{change["kind"].upper()}</td>
+                <td><strong>{link}</strong></td>
+                <td>{describe_change(change)}{f"<ul>{details}</ul>" if details else ""}</td>
+            </tr>'''
+    since = f"since the run of {previous_generated}" if previous_generated else "(no previous run to compare against)"
+
+    html = f'''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>BainUltra | Changes Since Last Run (Internal)</title>
+    <style>
+        :root {{
+            --bg-dark: #0a0a0f;
+            --bg-card: #12121a;
+            --accent-green: #22c55e;
+            --accent-red: #ef4444;
+            --accent-blue: #3b82f6;
+            --text-primary: #ffffff;
+            --text-secondary: #94a3b8;
+            --text-muted: #64748b;
+            --border-color: #1e293b;
+        }}
+        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
+        body {{
+            font-family: -apple-system, sans-serif;
+            background: var(--bg-dark);
+            color: var(--text-primary);
+            padding: 2rem;
+        }}
+        .container {{ max-width: 1200px; margin: 0 auto; }}
+        h1 {{ margin-bottom: 1rem; }}
+        .summary {{ color: var(--text-secondary); margin-bottom: 2rem; }}
+        table {{
+            width: 100%;
+            border-collapse: collapse;
+            background: var(--bg-card);
+            border-radius: 12px;
+            overflow: hidden;
+            font-size: 0.875rem;
+        }}
+        th, td {{
+            padding: 0.75rem 1rem;
+            text-align: left;
+            vertical-align: top;
+            border-bottom: 1px solid var(--border-color);
+            color: var(--text-secondary);
+        }}
+        th {{
+            background: rgba(59,130,246,0.1);
+            font-size: 0.75rem;
+            text-transform: uppercase;
+            letter-spacing: 0.05em;
+        }}
+        td strong, td a {{ color: var(--text-primary); }}
+        ul {{ margin: 0.5rem 0 0 1.25rem; color: var(--text-muted); }}
+        .new {{ color: var(--accent-green); font-weight: 600; }}
+        .changed {{ color: var(--accent-blue); font-weight: 600; }}
+        .removed {{ color: var(--accent-red); font-weight: 600; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>Changes Since Last Run</h1>
+        <p class="summary">{len(changes)} agencies changed {since}.</p>
+        <table>
+            <thead>
+                <tr>
+                    <th>Change</th>
+                    <th>Agency</th>
+                    <th>Summary</th>
+                </tr>
+            </thead>
+            <tbody>
+                {rows}
+            </tbody>
+        </table>
+        <p style="color: var(--text-muted); margin-top: 2rem; font-size: 0.875rem;">
+            Generated: {datetime.now().strftime('%B %d, %Y at %H:%M')}
+        </p>
+    </div>
+</body>
+</html>'''
+    return html
+
+def find_at_risk_accounts(account_data=None, top_k=100, thresholds=None):
+    """Stream every account once and keep the top_k At Risk accounts by revenue lost"""
+    account_data = ACCOUNT_DATA if account_data is None else account_data
+    at_risk = (thresholds or ACCOUNT_STATUS_THRESHOLDS)["at_risk"]
+
+    heap = []
+    total_count = 0
+    total_lost = 0
+    seq = 0
+    for agency, accounts in account_data.items():
+        for acct_name, data in accounts.items():
+            rev_2024 = data.get("rev_2024", 0)
+            rev_2025 = data.get("rev_2025", 0)
+            if not rev_2025 < rev_2024 * at_risk:
+                continue
+            lost = rev_2024 - rev_2025
+            total_count += 1
+            total_lost += lost
+            # Min-heap keyed on lost; seq breaks ties without comparing names
+            entry = (lost, seq, agency, acct_name, rev_2024, rev_2025)
+            seq += 1
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            elif lost > heap[0][0]:
+                heapq.heapreplace(heap, entry)
+
+    accounts = [
+        {
+            "agency": agency,
+            "territory": TERRITORIES.get(agency, "Unknown"),
+            "account": acct_name,
+            "rev_2024": rev_2024,
+            "rev_2025": rev_2025,
+            "lost": lost,
+            "pct_retained": rev_2025 / rev_2024 * 100
+        }
+        for lost, _, agency, acct_name, rev_2024, rev_2025 in sorted(heap, key=lambda e: (-e[0], e[1]))
+    ]
+    return {"accounts": accounts, "total_count": total_count, "total_lost": total_lost}
+
+def generate_at_risk_csv(at_risk):
+    """Generate the at-risk account list as CSV text"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["rank", "agency", "territory", "account", "rev_2024", "rev_2025", "lost", "pct_retained"])
+    for rank, acct in enumerate(at_risk["accounts"], 1):
+        writer.writerow([rank, acct["agency"], acct["territory"], acct["account"],
+                         acct["rev_2024"], acct["rev_2025"], acct["lost"], f"{acct['pct_retained']:.1f}"])
+    return buffer.getvalue()
+
+def generate_at_risk_page(at_risk):
+    """Generate internal company-wide at-risk account report"""
+    rows = ""
+    for rank, acct in enumerate(at_risk["accounts"], 1):
+        rows += f'''
+            <tr>
+                <td>{rank}</td>
+                <td><strong>{acct["account"]}</strong></td>
+                <td>{acct["agency"]}<br><span style="color: var(--text-muted); font-size: 0.75rem;">{acct["territory"]}</span></td>
+                <td>${acct["rev_2024"]:,.0f}</td>
+                <td>${acct["rev_2025"]:,.0f}</td>
+                <td class="negative">-${acct["lost"]:,.0f}</td>
+                <td>{acct["pct_retained"]:.0f}%</td>
+            </tr>'''
+
+    html = f'''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>BainUltra | At-Risk Accounts (Internal)</title>
+    <style>
+        :root {{
+            --bg-dark: #0a0a0f;
+            --bg-card: #12121a;
+            --accent-blue: #3b82f6;
+            --accent-red: #ef4444;
+            --text-primary: #ffffff;
+            --text-secondary: #94a3b8;
+            --text-muted: #64748b;
+            --border-color: #1e293b;
+        }}
+        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
+        body {{
+            font-family: -apple-system, sans-serif;
+            background: var(--bg-dark);
+            color: var(--text-primary);
+            padding: 2rem;
+        }}
+        .container {{ max-width: 1200px; margin: 0 auto; }}
+        h1 {{ margin-bottom: 1rem; }}
+        .summary {{ color: var(--text-secondary); margin-bottom: 2rem; }}
+        .warning {{
+            background: rgba(239,68,68,0.1);
+            border: 1px solid rgba(239,68,68,0.3);
+            color: #fca5a5;
+            padding: 1rem;
+            border-radius: 8px;
+            margin-bottom: 2rem;
+        }}
+        table {{
+            width: 100%;
+            border-collapse: collapse;
+            background: var(--bg-card);
+            border-radius: 12px;
+            overflow: hidden;
+        }}
+        th, td {{
+            padding: 0.75rem 1rem;
+            text-align: left;
+            border-bottom: 1px solid var(--border-color);
+        }}
+        th {{
+            background: rgba(59,130,246,0.1);
+            font-size: 0.75rem;
+            text-transform: uppercase;
+            letter-spacing: 0.05em;
+            color: var(--text-secondary);
+        }}
+        .negative {{ color: var(--accent-red); }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <h1>At-Risk Accounts</h1>
+        <div class="warning">
+            <strong>INTERNAL USE ONLY</strong> - Accounts whose 2025 revenue fell below {ACCOUNT_STATUS_THRESHOLDS["at_risk"] * 100:.0f}% of 2024, ranked by dollars lost.
+        </div>
+        <p class="summary">{at_risk["total_count"]} at-risk accounts across all agencies, ${at_risk["total_lost"]:,.0f} lost year over year. Showing top {len(at_risk["accounts"])}.</p>
+        <table>
+            <thead>
+                <tr>
+                    <th>Rank</th>
+                    <th>Account</th>
+                    <th>Agency</th>
+                    <th>2024</th>
+                    <th>2025</th>
+                    <th>$ Lost</th>
+                    <th>Retained</th>
+                </tr>
+            </thead>
+            <tbody>
+                {rows}
+            </tbody>
+        </table>
+        <p style="color: var(--text-muted); margin-top: 2rem; font-size: 0.875rem;">
+            Generated: {datetime.now().strftime('%B %d, %Y at %H:%M')}
+        </p>
+    </div>
+</body>
+</html>'''
+    return html
+
+def build_metrics_columns(agencies_data):
+    """Collect per-agency metrics into columns, one row per agency"""
+    years = sorted({year for data in agencies_data.values() for year in data["metrics"]["yearly_data"]})
+    columns = {name: [] for name in METRIC_EXPORT_FIELDS}
+    # rev_2024 / rev_2025 are already metric fields
+    years = [year for year in years if f"rev_{year}" not in columns]
+    columns.update({f"rev_{year}": [] for year in years})
+    for agency, data in agencies_data.items():
+        metrics = data["metrics"]
+        forecast = metrics.get("forecast") or {}
+        peers = metrics.get("peers") or {"percentiles": {}}
+        accounts = metrics.get("account_analytics") or {"churned": [], "reactivated": []}
+        row = dict(metrics, agency=agency, token=data["token"], territory=data["territory"],
+                   forecast_value=forecast.get("value"), forecast_low=forecast.get("low"),
+                   forecast_high=forecast.get("high"), growth_rank=peers.get("growth_rank"),
+                   **{f"{metric}_pct": peers["percentiles"].get(metric) for metric in PEER_METRICS},
+                   top5_share=accounts.get("top5_share"), hhi=accounts.get("hhi"),
+                   churned_accounts=len(accounts["churned"]), churned_revenue=accounts.get("churned_revenue"),
+                   reactivated_accounts=len(accounts["reactivated"]),
+                   reactivated_revenue=accounts.get("reactivated_revenue"))
+        for name in METRIC_EXPORT_FIELDS:
+            columns[name].append(row[name])
+        for year in years:
+            columns[f"rev_{year}"].append(metrics["yearly_data"].get(year, 0))
+    return columns
+
+def build_account_columns(agencies_data):
+    """Collect classified account rows into columns, one row per account"""
+    columns = flatten_account_data(agencies_data.keys())
+    classified = classify_accounts_batch(columns)
+    columns["yoy"] = classified["yoy"]
+    columns["status"] = classified["status"]
+    return columns
+
+def encode_columns(columns, fmt="parquet"):
+    """Encode a column dict as Parquet, Arrow IPC or CSV (without pyarrow); returns (suffix, bytes)"""
+    if fmt in ("parquet", "arrow") and pa is not None:
+        table = pa.table(columns)
+        sink = pa.BufferOutputStream()
+        if fmt == "parquet":
+            pq.write_table(table, sink)
+        else:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        return f".{fmt}", sink.getvalue().to_pybytes()
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns.keys())
+    writer.writerows(zip(*columns.values()))
+    return ".csv", buffer.getvalue().encode("utf-8")
+
+def export_metrics(backend, agencies_data, export_dir=f"{REPORTS_DIR}/exports", fmt="parquet"):
+    """Export agency metrics and account rows as columnar files for BI tools"""
+    paths = []
+    for name, columns in (("agency_metrics", build_metrics_columns(agencies_data)),
+                          ("account_rows", build_account_columns(agencies_data))):
+        suffix, data = encode_columns(columns, fmt)
+        paths.append(f"{export_dir}/{name}{suffix}")
+        backend.write_bytes(paths[-1], data)
+    return paths
+
+def build_territory_rollups(agencies_data):
+    """Roll agency metrics up to region and country level in one bottom-up pass"""
+    rollups = {"country": {}, "region": {}}
+
+    def node(level, name, parent):
+        entry = rollups[level].get(name)
+        if entry is None:
+            entry = rollups[level][name] = {
+                "level": level, "name": name, "parent": parent, "children": [], "yearly_data": {}, "agencies": []
+            }
+        return entry
+
+    for agency, data in agencies_data.items():
+        country_name, region_name = TERRITORY_HIERARCHY.get(agency, ("Other", "Unassigned"))
+        country = node("country", country_name, None)
+        region = node("region", region_name, country_name)
+        if region_name not in country["children"]:
+            country["children"].append(region_name)
+        region["children"].append(agency)
+        for entry in (region, country):
+            entry["agencies"].append(agency)
+            for year, value in data["metrics"]["yearly_data"].items():
+                entry["yearly_data"][year] = entry["yearly_data"].get(year, 0) + value
+
+    for level in rollups.values():
+        for entry in level.values():
+            entry["metrics"] = calculate_metrics(entry["name"], entry["yearly_data"])
+    return rollups
+
+def rollup_slug(level, name):
+    """File name stem for a rollup report"""
+    return f"{level}-" + re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+def generate_rollup_page(entry, rollups, agencies_data):
+    """Generate an internal region or country rollup report"""
+    metrics = entry["metrics"]
+    if entry["level"] == "country":
+        children = [(name, rollups["region"][name]["metrics"], f'{rollup_slug("region", name)}.html', len(rollups["region"][name]["agencies"]))
+                    for name in entry["children"]]
+        child_label = "Region"
+        breadcrumb = f'<a href="index.html">All Territories</a> / {entry["name"]}'
+    else:
+        children = [(name, agencies_data[name]["metrics"], f'../{agencies_data[name]["token"]}.html', agencies_data[name]["territory"])
+                    for name in entry["children"]]
+        child_label = "Agency"
+        breadcrumb = f'<a href="index.html">All Territories</a> / <a href="{rollup_slug("country", entry["parent"])}.html">{entry["parent"]}</a> / {entry["name"]}'
+
+    rows = ""
+    for name, child, href, detail in sorted(children, key=lambda c: c[1]["rev_2025"], reverse=True):
+        share = (child["rev_2025"] / metrics["rev_2025"] * 100) if metrics["rev_2025"] > 0 else 0
+        rows += f'''
+                    <tr>
+                        <td><a href="{href}" style="color: var(--text-primary);"><strong>{name}</strong></a><br><span style="color: var(--text-muted); font-size: 0.75rem;">{f"{detail} agencies" if isinstance(detail, int) else detail}</span></td>
+                        <td>{format_currency(child["rev_2024"])}</td>
+                        <td>{format_currency(child["rev_2025"])}</td>
+                        <td class="{change_class(child["yoy_change"])}">{child["yoy_change"]:+.1f}%</td>
+                        <td class="{change_class(child["vs_ten_year"])}">{child["vs_ten_year"]:+.1f}%</td>
+                        <td>{share:.0f}%</td>
+                    </tr>'''
+
+    years = sorted(metrics["yearly_data"])
+    html = f'''{generate_overview_head(f"{entry['name']} {entry['level'].title()} Report (Internal)")}
+<body>
+    <section class="hero" style="padding-top: 4rem;">
+        <div class="hero-badge">{breadcrumb}</div>
+        <h1>{entry["name"]}</h1>
+        <p>{entry["level"].title()} rollup of {len(entry["agencies"])} agencies</p>
+        <div class="hero-stats">
+            <div class="hero-stat">
+                <div class="hero-stat-value">{format_currency(metrics["rev_2025"])}</div>
+                <div class="hero-stat-label">2025 Revenue</div>
+            </div>
+            <div class="hero-stat">
+                <div class="hero-stat-value {change_class(metrics["yoy_change"])}">{metrics["yoy_change"]:+.1f}%</div>
+                <div class="hero-stat-label">vs 2024</div>
+            </div>
+            <div class="hero-stat">
+                <div class="hero-stat-value {change_class(metrics["vs_ten_year"])}">{metrics["vs_ten_year"]:+.1f}%</div>
+                <div class="hero-stat-label">vs 10-Year Avg ({format_currency(metrics["ten_year_avg"])})</div>
+            </div>
+            <div class="hero-stat">
+                <div class="hero-stat-value">{format_currency(metrics["pre_covid_avg"])}</div>
+                <div class="hero-stat-label">Pre-COVID Avg</div>
+            </div>
+        </div>
+    </section>
+
+    <section class="section">
+        <div class="chart-container">
+            <div class="chart-title">10-Year Revenue Trend</div>
+            <canvas id="revenueChart"></canvas>
+        </div>
+        <div class="card scroll-table">
+            <table class="data-table">
+                <thead>
+                    <tr><th>{child_label}</th><th>2024</th><th>2025</th><th>YoY</th><th>vs 10-Year Avg</th><th>Share of 2025</th></tr>
+                </thead>
+                <tbody>{rows}
+                </tbody>
+            </table>
+        </div>
+    </section>
+{generate_overview_footer()}
+
+    <script>
+        new Chart(document.getElementById('revenueChart'), {{
+            type: 'line',
+            data: {{
+                labels: {json.dumps([str(y) for y in years])},
+                datasets: [{{
+                    label: 'Revenue ($K)',
+                    data: {json.dumps([round(metrics["yearly_data"][y] / 1000) for y in years])},
+                    borderColor: '#3b82f6',
+                    backgroundColor: 'rgba(59, 130, 246, 0.1)',
+                    fill: true,
+                    tension: 0.3
+                }}]
+            }},
+            options: {{
+                responsive: true,
+                aspectRatio: 3,
+                plugins: {{ legend: {{ labels: {{ color: '#94a3b8' }} }} }},
+                scales: {{
+                    x: {{ grid: {{ color: '#1e293b' }}, ticks: {{ color: '#94a3b8' }} }},
+                    y: {{ grid: {{ color: '#1e293b' }}, ticks: {{ color: '#94a3b8' }} }}
+                }}
+            }}
+        }});
+    </script>
+</body>
+</html>'''
+    return html
+
+def generate_rollup_index(rollups):
+    """Generate the internal territory hierarchy index (country > region)"""
+    rows = ""
+    for country in sorted(rollups["country"].values(), key=lambda e: e["metrics"]["rev_2025"], reverse=True):
+        for entry, indent in [(country, 0)] + [(rollups["region"][name], 1) for name in sorted(
+                country["children"], key=lambda n: rollups["region"][n]["metrics"]["rev_2025"], reverse=True)]:
+            metrics = entry["metrics"]
+            label = f'<strong>{entry["name"]}</strong>' if indent == 0 else entry["name"]
+            rows += f'''
+                    <tr>
+                        <td style="padding-left: {1 + indent * 2}rem;"><a href="{rollup_slug(entry["level"], entry["name"])}.html" style="color: var(--text-primary);">{label}</a></td>
+                        <td>{len(entry["agencies"])}</td>
+                        <td>{format_currency(metrics["rev_2024"])}</td>
+                        <td>{format_currency(metrics["rev_2025"])}</td>
+                        <td class="{change_class(metrics["yoy_change"])}">{metrics["yoy_change"]:+.1f}%</td>
+                        <td class="{change_class(metrics["vs_ten_year"])}">{metrics["vs_ten_year"]:+.1f}%</td>
+                    </tr>'''
+
+    html = f'''{generate_overview_head("Territory Rollups (Internal)")}
+<body>
+    <section class="section" style="padding-top: 4rem;">
+        <h2 class="section-title">Territory Rollups</h2>
+        <p class="section-subtitle">Country and region totals built from agency revenue</p>
+        <div class="card scroll-table">
+            <table class="data-table">
+                <thead>
+                    <tr><th>Territory</th><th>Agencies</th><th>2024</th><th>2025</th><th>YoY</th><th>vs 10-Year Avg</th></tr>
+                </thead>
+                <tbody>{rows}
+                </tbody>
+            </table>
+        </div>
+    </section>
+{generate_overview_footer()}
+</body>
+</html>'''
+    return html
+
+def write_rollup_reports(backend, rollups, agencies_data, rollups_dir=f"{REPORTS_DIR}/regions", agencies=None):
+    """Write the territory index and one report per country and region"""
+    if agencies is not None:
+        parents = [TERRITORY_HIERARCHY.get(agency, ("Other", "Unassigned")) for agency in agencies]
+        wanted = {"country": {country for country, _ in parents}, "region": {region for _, region in parents}}
+    backend.write_page(f"{rollups_dir}/index.html", generate_rollup_index(rollups))
+    written = 0
+    for level_name, level in rollups.items():
+        for entry in level.values():
+            if agencies is not None and entry["name"] not in wanted[level_name]:
+                continue
+            backend.write_page(f"{rollups_dir}/{rollup_slug(entry['level'], entry['name'])}.html",
+                               generate_rollup_page(entry, rollups, agencies_data))
+            written += 1
+    return written
+
+def hoist_inline_styles(html):
+    """Move inline style attributes used more than once into generated classes"""
+    style_attr = re.compile(r'\sstyle=(["\'])(.*?)\1')
+    counts = {}
+    for match in style_attr.finditer(html):
+        style = match.group(2).strip().rstrip(";")
+        counts[style] = counts.get(style, 0) + 1
+    hoisted = {style: f"u{i}" for i, style in enumerate(s for s, n in counts.items() if n > 1)}
+    if not hoisted or "</style>" not in html:
+        return html
+
+    def rewrite_tag(match):
+        tag = match.group(0)
+        style = style_attr.search(tag)
+        if not style:
+            return tag
+        name = hoisted.get(style.group(2).strip().rstrip(";"))
+        if name is None:
+            return tag
+        tag = tag[:style.start()] + tag[style.end():]
+        class_attr = re.search(r'\sclass=(["\'])(.*?)\1', tag)
+        if class_attr:
+            return f'{tag[:class_attr.start(2)]}{class_attr.group(2)} {name}{tag[class_attr.end(2):]}'
+        return f'{tag[:-1]} class="{name}">'
+
+    html = re.sub(r"<[a-zA-Z][^<>]*\sstyle=[^<>]*>", rewrite_tag, html)
+    # !important keeps inline-style precedence over more specific selectors (e.g. .account-table td)
+    rules = "".join(
+        f".{name}{{" + ";".join(f"{decl.strip()}!important" for decl in style.split(";") if decl.strip()) + "}"
+        for style, name in hoisted.items()
+    )
+    return html.replace("</style>", rules + "</style>", 1)
+
+def round_chart_values(script, decimals=CHART_VALUE_DECIMALS):
+    """Round float literals inside chart data arrays to the displayed precision"""
+    def round_array(match):
+        def round_value(number):
+            # Fixed-point, never exponent notation; trailing zeros carry no precision
+            text = f"{float(number.group(0)):.{decimals}f}"
+            return text.rstrip("0").rstrip(".") if "." in text else text
+        return re.sub(r"-?\d+\.\d+", round_value, match.group(0))
+    return re.sub(r"data:\s*\[[^\]]*\]", round_array, script)
+
+def minify_html(html):
+    """Minify a generated page: hoist repeated styles, round chart data, collapse whitespace"""
+    html = hoist_inline_styles(html)
+    parts = re.split(r"(<script\b.*?</script>|<style\b.*?</style>)", html, flags=re.S)
+    for i, part in enumerate(parts):
+        if part.startswith("<script"):
+            # Keep line breaks in scripts; only strip indentation and blank lines
+            part = round_chart_values(part)
+            parts[i] = "\n".join(line.strip() for line in part.splitlines() if line.strip())
+        elif part.startswith("<style"):
+            part = re.sub(r"\s+", " ", part)
+            parts[i] = re.sub(r"\s*([{};,])\s*|(:)\s+", lambda m: m.group(1) or m.group(2), part)
+        else:
+            part = re.sub(r">\s*\n\s*<", "><", part)
+            part = re.sub(r"^\s*\n\s*|\s*\n\s*$", "", part)
+            parts[i] = re.sub(r"\s+", " ", part)
+    return "".join(parts).strip()
+
+def calculate_network_summary(agencies_data):
+    """Aggregate network-wide totals once so every overview page shares them"""
+    ranked = sorted(agencies_data.items(), key=lambda x: x[1]["metrics"]["rev_2025"], reverse=True)
+    total_2024 = sum(data["metrics"]["rev_2024"] for _, data in ranked)
+    total_2025 = sum(data["metrics"]["rev_2025"] for _, data in ranked)
+
+    # Network revenue by year, summed from the per-agency series already in memory
+    yearly_totals = {}
+    for _, data in ranked:
+        for year, value in data["metrics"]["yearly_data"].items():
+            yearly_totals[year] = yearly_totals.get(year, 0) + value
+
+    # Every listed account classified once, shared by all pages
+    columns = flatten_account_data(agency for agency, _ in ranked)
+    classified = classify_accounts_batch(columns)
+    accounts = [
+        {
+            "agency": agency,
+            "territory": agencies_data[agency]["territory"],
+            "name": name,
+            "rev_2024": prev,
+            "rev_2025": cur,
+            "change": cur - prev,
+            "yoy": yoy,
+            "status": status,
+            "status_class": status_class
+        }
+        for agency, name, prev, cur, yoy, status, status_class in zip(
+            columns["agency"], columns["account"], columns["rev_2024"], columns["rev_2025"],
+            classified["yoy"], classified["status"], classified["status_class"]
+        )
+    ]
+    status_counts = {label: 0 for label in ("Growing", "Stable", "Declining", "At Risk")}
+    for totals in classified["by_agency"].values():
+        for label, count in totals["counts"].items():
+            status_counts[label] += count
+
+    by_yoy = sorted(ranked, key=lambda x: x[1]["metrics"]["yoy_change"], reverse=True)
+    top_five_2025 = sum(data["metrics"]["rev_2025"] for _, data in ranked[:5])
+
+    return {
+        "agency_count": len(ranked),
+        "ranked": ranked,
+        "by_yoy": by_yoy,
+        "growing": [(a, d) for a, d in by_yoy if d["metrics"]["trend"] == "growing"],
+        "declining": [(a, d) for a, d in reversed(by_yoy) if d["metrics"]["trend"] == "declining"],
+        "total_2024": total_2024,
+        "total_2025": total_2025,
+        "total_change": total_2025 - total_2024,
+        "yoy_change": ((total_2025 - total_2024) / total_2024 * 100) if total_2024 > 0 else 0,
+        "avg_yoy": sum(d["metrics"]["yoy_change"] for _, d in ranked) / len(ranked) if ranked else 0,
+        "top_five_share": (top_five_2025 / total_2025 * 100) if total_2025 > 0 else 0,
+        "yearly_totals": dict(sorted(yearly_totals.items())),
+        "accounts": accounts,
+        "status_counts": status_counts,
+        "account_status_by_agency": classified["by_agency"]
+    }
+
+def format_signed_currency(amount):
+    """Format a revenue delta with an explicit sign"""
+    return f"{'+' if amount > 0 else '-' if amount < 0 else ''}{format_currency(abs(amount))}"
+
+def change_class(value):
+    """CSS class for a percentage change, matching the agency report thresholds"""
+    return "positive" if value > 0 else "negative" if value < -5 else "neutral"
+
+# Shared styling for the top-level overview pages
+OVERVIEW_STYLES = """
+        :root {
+            --bg-dark: #0a0a0f;
+            --bg-card: #12121a;
+            --bg-card-hover: #1a1a25;
+            --accent-blue: #3b82f6;
+            --accent-cyan: #06b6d4;
+            --accent-purple: #8b5cf6;
+            --accent-green: #10b981;
+            --accent-red: #ef4444;
+            --accent-orange: #f97316;
+            --accent-yellow: #eab308;
+            --text-primary: #ffffff;
+            --text-secondary: #94a3b8;
+            --text-muted: #64748b;
+            --border-color: #1e293b;
+        }
+        * { margin: 0; padding: 0; box-sizing: border-box; }
+        body {
+            font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif;
+            background: var(--bg-dark);
+            color: var(--text-primary);
+            line-height: 1.6;
+        }
+        nav {
+            position: fixed;
+            top: 0; left: 0; right: 0;
+            z-index: 1000;
+            padding: 1rem 2rem;
+            background: rgba(10, 10, 15, 0.9);
+            backdrop-filter: blur(20px);
+            border-bottom: 1px solid var(--border-color);
+        }
+        .nav-content {
+            max-width: 1400px;
+            margin: 0 auto;
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+        }
+        .logo { height: 36px; }
+        .nav-links { display: flex; gap: 1.5rem; }
+        .nav-links a {
+            color: var(--text-secondary);
+            text-decoration: none;
+            font-size: 0.875rem;
+            font-weight: 500;
+        }
+        .nav-links a:hover { color: var(--text-primary); }
+        .hero {
+            padding: 8rem 2rem 4rem;
+            text-align: center;
+            background: radial-gradient(circle at 20% 80%, rgba(59, 130, 246, 0.08) 0%, transparent 50%),
+                        radial-gradient(circle at 80% 20%, rgba(139, 92, 246, 0.08) 0%, transparent 50%);
+        }
+        .hero-badge {
+            display: inline-block;
+            padding: 0.5rem 1rem;
+            background: rgba(59, 130, 246, 0.1);
+            border: 1px solid rgba(59, 130, 246, 0.3);
+            border-radius: 50px;
+            font-size: 0.875rem;
+            color: var(--accent-blue);
+            margin-bottom: 1.5rem;
+        }
+        .hero h1 { font-size: 3rem; font-weight: 800; margin-bottom: 1rem; }
+        .hero p { color: var(--text-secondary); font-size: 1.125rem; max-width: 800px; margin: 0 auto; }
+        .hero-stats {
+            display: flex;
+            justify-content: center;
+            gap: 4rem;
+            margin-top: 3rem;
+            flex-wrap: wrap;
+        }
+        .hero-stat-value { font-size: 2.5rem; font-weight: 800; }
+        .hero-stat-label { font-size: 0.875rem; color: var(--text-muted); }
+        .section { max-width: 1400px; margin: 0 auto; padding: 3rem 2rem; }
+        .section-title { font-size: 1.75rem; font-weight: 700; }
+        .section-subtitle { color: var(--text-secondary); margin-bottom: 1.5rem; }
+        .grid-2 { display: grid; grid-template-columns: repeat(2, 1fr); gap: 1.5rem; }
+        .grid-3 { display: grid; grid-template-columns: repeat(3, 1fr); gap: 1.5rem; }
+        @media (max-width: 900px) {
+            .grid-2, .grid-3 { grid-template-columns: 1fr; }
+            .hero-stats { gap: 2rem; }
+            .nav-links { display: none; }
+        }
+        .card, .chart-container {
+            background: var(--bg-card);
+            border: 1px solid var(--border-color);
+            border-radius: 16px;
+            padding: 1.5rem;
+            margin-bottom: 1.5rem;
+        }
+        .card-title, .chart-title { font-size: 1.125rem; font-weight: 600; margin-bottom: 1rem; }
+        .card-value { font-size: 2rem; font-weight: 700; margin-bottom: 0.5rem; }
+        .card-detail { font-size: 0.875rem; color: var(--text-secondary); }
+        .metric-row {
+            display: flex;
+            justify-content: space-between;
+            padding: 0.75rem 0;
+            border-bottom: 1px solid var(--border-color);
+        }
+        .metric-label { color: var(--text-secondary); }
+        .metric-value { font-weight: 600; }
+        .positive { color: var(--accent-green); }
+        .negative { color: var(--accent-red); }
+        .neutral { color: var(--accent-yellow); }
+        .scroll-table { overflow-x: auto; }
+        .data-table { width: 100%; border-collapse: collapse; font-size: 0.875rem; }
+        .data-table th {
+            background: rgba(59, 130, 246, 0.1);
+            padding: 0.75rem;
+            text-align: left;
+            font-size: 0.7rem;
+            text-transform: uppercase;
+            letter-spacing: 0.05em;
+            color: var(--text-secondary);
+            border-bottom: 1px solid var(--border-color);
+        }
+        .data-table td {
+            padding: 0.75rem;
+            border-bottom: 1px solid var(--border-color);
+            color: var(--text-secondary);
+        }
+        .data-table tr:hover { background: var(--bg-card-hover); }
+        .data-table td strong { color: var(--text-primary); }
+        .status-growing { color: var(--accent-green); font-weight: 600; }
+        .status-stable { color: var(--accent-yellow); }
+        .status-declining { color: var(--accent-red); }
+        .status-at-risk { color: var(--accent-orange); font-weight: 600; }
+        footer {
+            text-align: center;
+            color: var(--text-muted);
+            font-size: 0.75rem;
+            padding: 2rem;
+            border-top: 1px solid var(--border-color);
+        }
+"""
+
+def generate_overview_head(title):
+    """Generate the shared <head> block for the overview pages"""
+    return f'''<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>BainUltra | {title}</title>
+    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800;900&display=swap" rel="stylesheet">
+    <style>{OVERVIEW_STYLES}    </style>
+</head>'''
+
+def generate_overview_nav(links):
+    """Generate the fixed top navigation bar"""
+    anchors = "\n".join(f'                <a href="{href}">{label}</a>' for href, label in links)
+    return f'''
+    <nav>
+        <div class="nav-content">
+            <img src="logo.png" alt="BainUltra" class="logo">
+            <div class="nav-links">
+{anchors}
+            </div>
+        </div>
+    </nav>'''
+
+def generate_overview_footer():
+    """Generate the footer shared by the overview pages"""
+    return f'''
+    <footer>
+        <p>BainUltra Sales Analysis | Data Source: Salesforce CRM</p>
+        <p>Generated: {datetime.now().strftime('%B %d, %Y at %H:%M')}</p>
+    </footer>'''
+
+def generate_account_change_rows(accounts):
+    """Generate overview table rows for a list of classified accounts"""
+    rows = ""
+    for acct in accounts:
+        rows += f'''
+                        <tr>
+                            <td><strong>{acct["name"]}</strong></td>
+                            <td>{acct["agency"]}</td>
+                            <td>{format_currency(acct["rev_2024"])}</td>
+                            <td>{format_currency(acct["rev_2025"])}</td>
+                            <td class="{change_class(acct["change"])}">{format_signed_currency(acct["change"])}</td>
+                            <td class="{change_class(acct["yoy"])}">{acct["yoy"]:+.0f}%</td>
+                            <td class="{acct["status_class"]}">{acct["status"]}</td>
+                        </tr>'''
+    return rows
+
+def generate_overview_page(summary):
+    """Generate the top-level index.html sales performance overview"""
+    declining = sorted((a for a in summary["accounts"] if a["change"] < -30000), key=lambda a: a["change"])
+    growing = sorted((a for a in summary["accounts"] if a["change"] > 30000), key=lambda a: a["change"], reverse=True)
+    counts = summary["status_counts"]
+    years = list(summary["yearly_totals"].keys())
+    trend_data = [round(v / 1000) for v in summary["yearly_totals"].values()]
+
+    html = f'''{generate_overview_head("Sales Performance Analysis 2024-2025")}
+<body>{generate_overview_nav([("#yoy", "2024 vs 2025"), ("#accounts", "Accounts"), ("2024-vs-2025.html", "Comparison"), ("agencies.html", "Agencies")])}
+
+    <section class="hero">
+        <div class="hero-badge">Sales Performance Analysis | {datetime.now().strftime('%B %Y')}</div>
+        <h1>2024 vs 2025 Sales Performance Review</h1>
+        <p>Year-over-year analysis of agency and account performance. {counts["Declining"] + counts["At Risk"]} top accounts declining, {counts["Growing"]} growing.</p>
+        <div class="hero-stats">
+            <div class="hero-stat">
+                <div class="hero-stat-value {change_class(summary["yoy_change"])}">{format_signed_currency(summary["total_change"])}</div>
+                <div class="hero-stat-label">Revenue change 2024→2025</div>
+            </div>
+            <div class="hero-stat">
+                <div class="hero-stat-value {change_class(summary["yoy_change"])}">{summary["yoy_change"]:+.1f}%</div>
+                <div class="hero-stat-label">Network YoY change</div>
+            </div>
+            <div class="hero-stat">
+                <div class="hero-stat-value negative">{counts["At Risk"]}</div>
+                <div class="hero-stat-label">Top accounts at risk (&lt;50% of 2024)</div>
+            </div>
+            <div class="hero-stat">
+                <div class="hero-stat-value positive">{len(summary["growing"])}</div>
+                <div class="hero-stat-label">Agencies growing</div>
+            </div>
+        </div>
+    </section>
+
+    <section id="yoy" class="section">
+        <h2 class="section-title">2024 vs 2025 Snapshot</h2>
+        <p class="section-subtitle">Totals across {summary["agency_count"]} agency territories</p>
+        <div class="grid-2">
+            <div class="card">
+                <div class="card-title">Revenue Summary</div>
+                <div class="metric-row">
+                    <span class="metric-label">2024 Total Revenue</span>
+                    <span class="metric-value">{format_currency(summary["total_2024"])}</span>
+                </div>
+                <div class="metric-row">
+                    <span class="metric-label">2025 YTD Revenue</span>
+                    <span class="metric-value">{format_currency(summary["total_2025"])}</span>
+                </div>
+                <div class="metric-row">
+                    <span class="metric-label">YoY Change</span>
+                    <span class="metric-value {change_class(summary["yoy_change"])}">{format_signed_currency(summary["total_change"])} ({summary["yoy_change"]:+.1f}%)</span>
+                </div>
+                <div class="metric-row">
+                    <span class="metric-label">Top 5 Agency Share</span>
+                    <span class="metric-value">{summary["top_five_share"]:.0f}%</span>
+                </div>
+            </div>
+            <div class="card">
+                <div class="card-title">Account Health Distribution</div>
+                <canvas id="healthChart" height="200"></canvas>
+            </div>
+        </div>
+        <div class="chart-container">
+            <div class="chart-title">Network Revenue Trend</div>
+            <canvas id="trendChart"></canvas>
+        </div>
+    </section>
+
+    <section id="accounts" class="section">
+        <h2 class="section-title">Account Movement</h2>
+        <p class="section-subtitle">Top accounts that moved more than $30K year over year</p>
+        <div class="card" style="border-color: rgba(239, 68, 68, 0.3);">
+            <div class="card-title negative">Declining Accounts (Lost &gt;$30K YoY)</div>
+            <div class="scroll-table">
+                <table class="data-table">
+                    <thead>
+                        <tr><th>Account</th><th>Agency</th><th>2024</th><th>2025</th><th>$ Change</th><th>% Change</th><th>Status</th></tr>
+                    </thead>
+                    <tbody>{generate_account_change_rows(declining)}
+                    </tbody>
+                </table>
+            </div>
+        </div>
+        <div class="card" style="border-color: rgba(16, 185, 129, 0.3);">
+            <div class="card-title positive">Growing Accounts (Gained &gt;$30K YoY)</div>
+            <div class="scroll-table">
+                <table class="data-table">
+                    <thead>
+                        <tr><th>Account</th><th>Agency</th><th>2024</th><th>2025</th><th>$ Change</th><th>% Change</th><th>Status</th></tr>
+                    </thead>
+                    <tbody>{generate_account_change_rows(growing)}
+                    </tbody>
+                </table>
+            </div>
+        </div>
+    </section>
+{generate_overview_footer()}
+
+    <script>
+        new Chart(document.getElementById('healthChart'), {{
+            type: 'doughnut',
+            data: {{
+                labels: {json.dumps(list(counts.keys()))},
+                datasets: [{{
+                    data: {json.dumps(list(counts.values()))},
+                    backgroundColor: ['#10b981', '#eab308', '#ef4444', '#f97316'],
+                    borderWidth: 0
+                }}]
+            }},
+            options: {{
+                maintainAspectRatio: false,
+                plugins: {{ legend: {{ position: 'right', labels: {{ color: '#94a3b8' }} }} }}
+            }}
+        }});
+
+        new Chart(document.getElementById('trendChart'), {{
+            type: 'line',
+            data: {{
+                labels: {json.dumps([str(y) for y in years])},
+                datasets: [{{
+                    label: 'Revenue ($K)',
+                    data: {json.dumps(trend_data)},
+                    borderColor: '#3b82f6',
+                    backgroundColor: 'rgba(59, 130, 246, 0.1)',
+                    fill: true,
+                    tension: 0.3
+                }}]
+            }},
+            options: {{
+                responsive: true,
+                aspectRatio: 3,
+                plugins: {{ legend: {{ labels: {{ color: '#94a3b8' }} }} }},
+                scales: {{
+                    x: {{ grid: {{ color: '#1e293b' }}, ticks: {{ color: '#94a3b8' }} }},
+                    y: {{ grid: {{ color: '#1e293b' }}, ticks: {{ color: '#94a3b8' }} }}
+                }}
+            }}
+        }});
+    </script>
+</body>
+</html>'''
+    return html
+
+def generate_agencies_page(summary):
+    """Generate agencies.html with network insights and the full agency ranking"""
+    ranked = summary["ranked"]
+    top_twelve = ranked[:12]
+
+    def agency_lines(entries):
+        return "<br>\n                    ".join(
+            f'<strong>{agency}</strong> ({data["territory"]}) {data["metrics"]["yoy_change"]:+.0f}%' for agency, data in entries[:3]
+        )
+
+    ranking_rows = ""
+    for rank, (agency, data) in enumerate(ranked, 1):
+        metrics = data["metrics"]
+        ranking_rows += f'''
+                    <tr>
+                        <td>{rank}</td>
+                        <td><strong>{agency}</strong><br><span style="color: var(--text-muted); font-size: 0.75rem;">{data["territory"]}</span></td>
+                        <td>{format_currency(metrics["rev_2024"])}</td>
+                        <td>{format_currency(metrics["rev_2025"])}</td>
+                        <td class="{change_class(metrics["yoy_change"])}">{metrics["yoy_change"]:+.1f}%</td>
+                        <td class="{change_class(metrics["vs_ten_year"])}">{metrics["vs_ten_year"]:+.1f}%</td>
+                        <td>{len(ACCOUNT_DATA.get(agency, {}))}</td>
+                    </tr>'''
+
+    biggest_decline = summary["declining"][0][1]["metrics"]["yoy_change"] if summary["declining"] else 0
+
+    html = f'''{generate_overview_head("Agency Performance")}
+<body>{generate_overview_nav([("index.html", "Overview"), ("#performance", "Performance"), ("#rankings", "Rankings"), ("2024-vs-2025.html", "Comparison")])}
+
+    <section class="hero">
+        <div class="hero-badge">Agency Network Analysis</div>
+        <h1>Agency Performance<br>2024 vs 2025</h1>
+        <p>Review of {summary["agency_count"]} agency territories with revenue trends against their 10-year history.</p>
+        <div class="hero-stats">
+            <div class="hero-stat">
+                <div class="hero-stat-value" style="color: var(--accent-purple);">{summary["agency_count"]}</div>
+                <div class="hero-stat-label">Active Agencies</div>
+            </div>
+            <div class="hero-stat">
+                <div class="hero-stat-value {change_class(summary["avg_yoy"])}">{summary["avg_yoy"]:+.0f}%</div>
+                <div class="hero-stat-label">Avg YoY Change</div>
+            </div>
+            <div class="hero-stat">
+                <div class="hero-stat-value positive">{len(summary["growing"])}</div>
+                <div class="hero-stat-label">Agencies Growing</div>
+            </div>
+            <div class="hero-stat">
+                <div class="hero-stat-value" style="color: var(--accent-blue);">{format_currency(summary["total_2025"])}</div>
+                <div class="hero-stat-label">Total 2025 Revenue</div>
+            </div>
+        </div>
+    </section>
+
+    <section class="section" id="performance">
+        <h2 class="section-title">Key Insights</h2>
+        <p class="section-subtitle">What the data tells us</p>
+        <div class="grid-3">
+            <div class="card" style="border-left: 4px solid var(--accent-green);">
+                <div class="card-title">Growing Agencies</div>
+                <div class="card-value positive">{len(summary["growing"])} of {summary["agency_count"]}</div>
+                <div class="card-detail">
+                    {agency_lines(summary["growing"])}
+                </div>
+            </div>
+            <div class="card" style="border-left: 4px solid var(--accent-red);">
+                <div class="card-title">Biggest Declines</div>
+                <div class="card-value negative">{biggest_decline:.0f}%</div>
+                <div class="card-detail">
+                    {agency_lines(summary["declining"])}
+                </div>
+            </div>
+            <div class="card" style="border-left: 4px solid var(--accent-blue);">
+                <div class="card-title">Top 5 Share</div>
+                <div class="card-value">{summary["top_five_share"]:.0f}%</div>
+                <div class="card-detail">
+                    {", ".join(agency for agency, _ in ranked[:5])} represent {summary["top_five_share"]:.0f}% of agency revenue
+                </div>
+            </div>
+        </div>
+        <div class="chart-container">
+            <div class="chart-title">Agency Revenue: 2024 vs 2025 (Top 12)</div>
+            <canvas id="agencyComparisonChart"></canvas>
+        </div>
+        <div class="chart-container">
+            <div class="chart-title">Year-over-Year Change by Agency</div>
+            <canvas id="yoyChangeChart"></canvas>
+        </div>
+    </section>
+
+    <section class="section" id="rankings">
+        <h2 class="section-title">Agency Rankings</h2>
+        <p class="section-subtitle">Complete performance breakdown - all {summary["agency_count"]} agencies</p>
+        <div class="card scroll-table">
+            <table class="data-table">
+                <thead>
+                    <tr><th>Rank</th><th>Agency (Territory)</th><th>2024 Revenue</th><th>2025 Revenue</th><th>YoY</th><th>vs 10-Year Avg</th><th>Accounts</th></tr>
+                </thead>
+                <tbody>{ranking_rows}
+                </tbody>
+            </table>
+        </div>
+    </section>
+{generate_overview_footer()}
+
+    <script>
+        new Chart(document.getElementById('agencyComparisonChart'), {{
+            type: 'bar',
+            data: {{
+                labels: {json.dumps([agency for agency, _ in top_twelve])},
+                datasets: [
+                    {{ label: '2024', data: {json.dumps([round(d["metrics"]["rev_2024"] / 1000) for _, d in top_twelve])}, backgroundColor: 'rgba(59, 130, 246, 0.8)' }},
+                    {{ label: '2025', data: {json.dumps([round(d["metrics"]["rev_2025"] / 1000) for _, d in top_twelve])}, backgroundColor: 'rgba(139, 92, 246, 0.8)' }}
+                ]
+            }},
+            options: {{
+                responsive: true,
+                aspectRatio: 2.5,
+                plugins: {{ legend: {{ position: 'top', labels: {{ color: '#94a3b8' }} }} }},
+                scales: {{
+                    x: {{ grid: {{ color: '#1e293b' }}, ticks: {{ color: '#94a3b8' }} }},
+                    y: {{ grid: {{ color: '#1e293b' }}, ticks: {{ color: '#94a3b8', callback: function(value) {{ return '$' + value.toLocaleString() + 'K'; }} }} }}
+                }}
+            }}
+        }});
+
+        const yoyChanges = {json.dumps([round(d["metrics"]["yoy_change"], 1) for _, d in summary["by_yoy"]])};
+        new Chart(document.getElementById('yoyChangeChart'), {{
+            type: 'bar',
+            data: {{
+                labels: {json.dumps([agency for agency, _ in summary["by_yoy"]])},
+                datasets: [{{
+                    label: 'YoY Change %',
+                    data: yoyChanges,
+                    backgroundColor: yoyChanges.map(v => v >= 0 ? 'rgba(16, 185, 129, 0.8)' : 'rgba(239, 68, 68, 0.8)')
+                }}]
+            }},
+            options: {{
+                indexAxis: 'y',
+                responsive: true,
+                aspectRatio: 1.5,
+                plugins: {{ legend: {{ display: false }} }},
+                scales: {{
+                    x: {{ grid: {{ color: '#1e293b' }}, ticks: {{ color: '#94a3b8', callback: function(value) {{ return value + '%'; }} }} }},
+                    y: {{ grid: {{ color: '#1e293b' }}, ticks: {{ color: '#94a3b8' }} }}
+                }}
+            }}
+        }});
+    </script>
+</body>
+</html>'''
+    return html
+
+def generate_comparison_page(summary):
+    """Generate 2024-vs-2025.html comparing territories and accounts year over year"""
+    markets = [(data["territory"], data["metrics"]) for _, data in summary["by_yoy"]]
+    growth_markets = [m for m in markets if m[1]["yoy_change"] > 0]
+    decline_markets = [m for m in reversed(markets) if m[1]["yoy_change"] < 0]
+
+    def market_rows(entries):
+        rows = ""
+        for rank, (territory, metrics) in enumerate(entries, 1):
+            rows += f'''
+                        <tr>
+                            <td>{rank}</td>
+                            <td><strong>{territory}</strong></td>
+                            <td>{format_currency(metrics["rev_2024"])}</td>
+                            <td>{format_currency(metrics["rev_2025"])}</td>
+                            <td class="{change_class(metrics["yoy_change"])}">{metrics["yoy_change"]:+.0f}%</td>
+                        </tr>'''
+        return rows
+
+    top_gainers = sorted(summary["accounts"], key=lambda a: a["change"], reverse=True)[:10]
+    top_losers = sorted(summary["accounts"], key=lambda a: a["change"])[:10]
+
+    html = f'''{generate_overview_head("2024 vs 2025 Comparison")}
+<body>{generate_overview_nav([("index.html", "Full Analysis"), ("#markets", "Markets"), ("#accounts", "Accounts"), ("agencies.html", "Agencies")])}
+
+    <section class="hero">
+        <h1>2024 vs 2025 Comparison</h1>
+        <p>Year-over-Year Performance Analysis for VP Sales</p>
+        <div class="hero-stats">
+            <div class="hero-stat">
+                <div class="hero-stat-value">{format_currency(summary["total_2024"])}</div>
+                <div class="hero-stat-label">2024 Revenue</div>
+            </div>
+            <div class="hero-stat">
+                <div class="hero-stat-value">{format_currency(summary["total_2025"])}</div>
+                <div class="hero-stat-label">2025 Revenue (YTD) | <span class="{change_class(summary["yoy_change"])}">{summary["yoy_change"]:+.1f}%</span></div>
+            </div>
+            <div class="hero-stat">
+                <div class="hero-stat-value positive">{len(growth_markets)}</div>
+                <div class="hero-stat-label">Markets Growing</div>
+            </div>
+            <div class="hero-stat">
+                <div class="hero-stat-value negative">{len(decline_markets)}</div>
+                <div class="hero-stat-label">Markets Declining</div>
+            </div>
+        </div>
+    </section>
+
+    <section class="section" id="markets">
+        <h2 class="section-title">Market Performance</h2>
+        <p class="section-subtitle">Territory revenue comparison between 2024 and 2025</p>
+        <div class="chart-container">
+            <canvas id="marketsChart"></canvas>
+        </div>
+        <div class="grid-2">
+            <div class="card">
+                <div class="card-title positive">Top Growth Markets</div>
+                <table class="data-table">
+                    <thead><tr><th></th><th>Market</th><th>2024</th><th>2025</th><th>Change</th></tr></thead>
+                    <tbody>{market_rows(growth_markets)}
+                    </tbody>
+                </table>
+            </div>
+            <div class="card">
+                <div class="card-title negative">Declining Markets</div>
+                <table class="data-table">
+                    <thead><tr><th></th><th>Market</th><th>2024</th><th>2025</th><th>Change</th></tr></thead>
+                    <tbody>{market_rows(decline_markets)}
+                    </tbody>
+                </table>
+            </div>
+        </div>
+    </section>
+
+    <section class="section" id="accounts">
+        <h2 class="section-title">Account Performance</h2>
+        <p class="section-subtitle">Largest dollar movers among top accounts</p>
+        <div class="grid-2">
+            <div class="card scroll-table">
+                <div class="card-title positive">Top Gainers</div>
+                <table class="data-table">
+                    <thead><tr><th>Account</th><th>Agency</th><th>2024</th><th>2025</th><th>$ Change</th><th>% Change</th><th>Status</th></tr></thead>
+                    <tbody>{generate_account_change_rows(top_gainers)}
+                    </tbody>
+                </table>
+            </div>
+            <div class="card scroll-table">
+                <div class="card-title negative">Top Decliners</div>
+                <table class="data-table">
+                    <thead><tr><th>Account</th><th>Agency</th><th>2024</th><th>2025</th><th>$ Change</th><th>% Change</th><th>Status</th></tr></thead>
+                    <tbody>{generate_account_change_rows(top_losers)}
+                    </tbody>
+                </table>
+            </div>
+        </div>
+    </section>
+{generate_overview_footer()}
+
+    <script>
+        new Chart(document.getElementById('marketsChart'), {{
+            type: 'bar',
+            data: {{
+                labels: {json.dumps([territory for territory, _ in markets])},
+                datasets: [
+                    {{ label: '2024', data: {json.dumps([round(m["rev_2024"] / 1000) for _, m in markets])}, backgroundColor: 'rgba(59, 130, 246, 0.8)' }},
+                    {{ label: '2025', data: {json.dumps([round(m["rev_2025"] / 1000) for _, m in markets])}, backgroundColor: 'rgba(139, 92, 246, 0.8)' }}
+                ]
+            }},
+            options: {{
+                responsive: true,
+                aspectRatio: 2.5,
+                plugins: {{ legend: {{ position: 'top', labels: {{ color: '#94a3b8' }} }} }},
+                scales: {{
+                    x: {{ grid: {{ color: '#1e293b' }}, ticks: {{ color: '#94a3b8' }} }},
+                    y: {{ grid: {{ color: '#1e293b' }}, ticks: {{ color: '#94a3b8', callback: function(value) {{ return '$' + value.toLocaleString() + 'K'; }} }} }}
+                }}
+            }}
+        }});
+    </script>
+</body>
+</html>'''
+    return html
+
+class OutputBackend:
+    """Destination for generated files, addressed by paths relative to the site root"""
+
+    def __init__(self, minify=False):
+        self.minify = minify
+        self.page_bytes = {}
+
+    def write_bytes(self, path, data):
+        raise NotImplementedError
+
+    def read_text(self, path):
+        """Return an existing file's text, or None if it is missing or unreadable here"""
+        return None
+
+    def flush(self):
+        """Wait until every file written so far is stored; raise if any write failed"""
+
+    def close(self):
+        pass
+
+    def write_internal(self, path, data):
+        """Keep a file that is not published (e.g. metrics for the archive); plain backends drop it"""
+
+    def write_text(self, path, text):
+        self.write_bytes(path, text.encode("utf-8"))
+
+    def write_page(self, path, html):
+        """Write an HTML page, minifying it first when enabled"""
+        original = len(html.encode("utf-8"))
+        if self.minify:
+            html = minify_html(html)
+        data = html.encode("utf-8")
+        self.page_bytes[path] = (original, len(data))
+        self.write_bytes(path, data)
+
+    def minify_savings(self, prefix=""):
+        """Total (bytes before, bytes after) minification for pages under prefix"""
+        sizes = [size for path, size in self.page_bytes.items() if path.startswith(prefix)]
+        return sum(before for before, _ in sizes), sum(after for _, after in sizes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class LocalBackend(OutputBackend):
+    """Write files under a local site directory"""
+
+    def __init__(self, root, minify=False):
+        super().__init__(minify)
+        self.root = Path(root)
+
+    def write_bytes(self, path, data):
+        target = self.root / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Write-then-rename so a concurrent reader never sees a partial file
+        tmp_path = target.with_name(target.name + ".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, target)
+
+    def read_text(self, path):
+        target = self.root / path
+        return target.read_text(encoding="utf-8") if target.exists() else None
+
+    def __str__(self):
+        return str(self.root)
+
+class BundleBackend(OutputBackend):
+    """Stream every file into a single .tar, .tar.gz or .zip bundle"""
+
+    def __init__(self, path, minify=False):
+        super().__init__(minify)
+        self.path = Path(path)
+        self.mtime = time.time()
+        if self.path.suffix == ".zip":
+            self._zip = zipfile.ZipFile(self.path, "w", zipfile.ZIP_DEFLATED)
+            self._tar = None
+        else:
+            # Stream mode: members are written sequentially, nothing is buffered
+            self._zip = None
+            self._tar = tarfile.open(str(self.path), "w|gz" if self.path.name.endswith((".tar.gz", ".tgz")) else "w|")
+
+    def write_bytes(self, path, data):
+        if self._zip is not None:
+            self._zip.writestr(path, data)
+            return
+        info = tarfile.TarInfo(path)
+        info.size = len(data)
+        info.mtime = self.mtime
+        self._tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        (self._zip or self._tar).close()
+
+    def __str__(self):
+        return str(self.path)
+
+class ObjectStoreBackend(OutputBackend):
+    """Upload files to an S3-compatible object store concurrently over pooled connections"""
+
+    def __init__(self, endpoint, bucket, prefix="", workers=8, region=None, minify=False):
+        super().__init__(minify)
+        url = urllib.parse.urlsplit(endpoint)
+        self.endpoint = endpoint
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.region = region or os.environ.get("AWS_REGION", "us-east-1")
+        self.access_key = os.environ.get("AWS_ACCESS_KEY_ID")
+        self.secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
+        connection_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self._host = url.netloc
+        self._pool = queue.Queue()
+        for _ in range(workers):
+            self._pool.put(connection_class(url.hostname, url.port, timeout=30))
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._pending = []
+
+    def _key_path(self, path):
+        key = f"{self.prefix}/{path}" if self.prefix else path
+        return "/" + urllib.parse.quote(f"{self.bucket}/{key}")
+
+    def _sign(self, method, url_path, payload_hash):
+        headers = {"host": self._host, "x-amz-content-sha256": payload_hash}
+        if not (self.access_key and self.secret_key):
+            return headers
+        now = datetime.now(timezone.utc)
+        headers["x-amz-date"] = now.strftime("%Y%m%dT%H%M%SZ")
+        scope = f"{now:%Y%m%d}/{self.region}/s3/aws4_request"
+        signed = sorted(headers)
+        canonical_request = "\n".join([
+            method, url_path, "", "".join(f"{name}:{headers[name]}\n" for name in signed), ";".join(signed), payload_hash
+        ])
+        string_to_sign = "\n".join([
+            "AWS4-HMAC-SHA256", headers["x-amz-date"], scope, hashlib.sha256(canonical_request.encode()).hexdigest()
+        ])
+        key = f"AWS4{self.secret_key}".encode()
+        for part in (f"{now:%Y%m%d}", self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+        headers["Authorization"] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={';'.join(signed)}, Signature={signature}")
+        return headers
+
+    def _request(self, method, path, body=b""):
+        url_path = self._key_path(path)
+        headers = self._sign(method, url_path, hashlib.sha256(body).hexdigest())
+        if body:
+            headers["content-type"] = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        conn = self._pool.get()
+        try:
+            for attempt in range(2):
+                try:
+                    conn.request(method, url_path, body=body or None, headers=headers)
+                    response = conn.getresponse()
+                    return response.status, response.read()
+                except (http.client.HTTPException, OSError):
+                    # Stale keep-alive connection: reconnect once before giving up
+                    conn.close()
+                    if attempt:
+                        raise
+        finally:
+            self._pool.put(conn)
+
+    def _upload(self, path, data):
+        status, body = self._request("PUT", path, data)
+        if status >= 300:
+            raise OSError(f"PUT {path} failed with HTTP {status}: {body[:200]!r}")
+
+    def write_bytes(self, path, data):
+        self._pending.append(self._executor.submit(self._upload, path, data))
+
+    def read_text(self, path):
+        status, body = self._request("GET", path)
+        return body.decode("utf-8") if status == 200 else None
+
+    def flush(self):
+        pending, self._pending = self._pending, []
+        failures = [f.exception() for f in concurrent.futures.as_completed(pending) if f.exception()]
+        if failures:
+            raise failures[0]
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown()
+            while not self._pool.empty():
+                self._pool.get().close()
+
+    def __str__(self):
+        return f"s3://{self.bucket}/{self.prefix}"
+
+class ReportArchive:
+    """Append-only archive of every run's outputs, stored as deltas against the previous run"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+        # One pack per run: a length-prefixed, compressed index followed by compressed blobs
+        self.runs_dir = self.root / "runs"
+        self._indexes = {}
+        self._manifests = {}
+
+    def runs(self):
+        """Archived run ids, oldest first"""
+        return sorted(path.stem for path in self.runs_dir.glob("*.pack")) if self.runs_dir.exists() else []
+
+    def resolve_run(self, spec):
+        """Latest run at or before a run id or date prefix (e.g. 20260331 or 20260331T1200)"""
+        spec = spec.replace("-", "")
+        if "T" not in spec:
+            spec += "T235959"
+        candidates = [run for run in self.runs() if run <= spec.ljust(21, "9")]
+        if not candidates:
+            raise KeyError(f"No archived run at or before {spec}")
+        return candidates[-1]
+
+    def _index(self, run_id):
+        if run_id not in self._indexes:
+            with open(self.runs_dir / f"{run_id}.pack", "rb") as f:
+                (length,) = struct.unpack("<I", f.read(4))
+                index = json.loads(zlib.decompress(f.read(length)))
+            index["data_offset"] = 4 + length
+            self._indexes[run_id] = index
+        return self._indexes[run_id]
+
+    def manifest(self, run_id):
+        """{path: [sha, pack run id, chain depth]} for every file in a run"""
+        if run_id not in self._manifests:
+            index = self._index(run_id)
+            if "files" in index:
+                manifest = index["files"]
+            else:
+                # Delta against the base run's manifest: only the entries this run changed
+                manifest = dict(self.manifest(index["base"]), **index["changed"])
+            self._manifests[run_id] = manifest
+        return self._manifests[run_id]
+
+    def _blob(self, sha, pack_run):
+        index = self._index(pack_run)
+        offset, length, base = index["blobs"][sha]
+        with open(self.runs_dir / f"{pack_run}.pack", "rb") as f:
+            f.seek(index["data_offset"] + offset)
+            payload = zlib.decompress(f.read(length))
+        if base is None:
+            return payload
+        base_tokens = split_delta_tokens(self._blob(*base).decode("utf-8"))
+        ops = json.loads(payload)
+        return "".join("".join(base_tokens[op[0]:op[1]]) if isinstance(op, list) else op for op in ops).encode("utf-8")
+
+    def read(self, run_id, path):
+        """Contents of one file as of a run"""
+        sha, pack_run, _ = self.manifest(run_id)[path]
+        return self._blob(sha, pack_run)
+
+    def commit(self, files, run_id=None):
+        """Archive {path: bytes} as a new run and return its run id"""
+        # Microsecond run ids, so back-to-back runs (webhooks, --watch) don't share a pack
+        run_id = run_id or datetime.now().strftime("%Y%m%dT%H%M%S%f")
+        runs = self.runs()
+        if run_id in runs:
+            raise FileExistsError(f"Archived run {run_id} already exists")
+        previous = self.manifest(runs[-1]) if runs else {}
+
+        # Files not written this run (e.g. a single-agency rebuild) carry over unchanged
+        manifest = dict(previous)
+        blobs = {}
+        data = bytearray()
+        for path, content in sorted(files.items()):
+            sha = hashlib.sha256(content).hexdigest()
+            prior = previous.get(path)
+            if prior and prior[0] == sha:
+                manifest[path] = prior
+                continue
+            if sha in blobs:
+                manifest[path] = [sha, run_id, blobs[sha][3]]
+                continue
+
+            full = zlib.compress(content, 9)
+            payload, base, depth = full, None, 0
+            if prior and prior[2] + 1 < ARCHIVE_KEYFRAME_INTERVAL:
+                try:
+                    ops = delta_ops(self._blob(prior[0], prior[1]).decode("utf-8"), content.decode("utf-8"))
+                except UnicodeDecodeError:
+                    ops = None
+                delta = zlib.compress(json.dumps(ops, separators=(",", ":")).encode("utf-8"), 9) if ops is not None else None
+                if delta is not None and len(delta) < len(full):
+                    payload, base, depth = delta, prior[:2], prior[2] + 1
+
+            blobs[sha] = [len(data), len(payload), base, depth]
+            data.extend(payload)
+            manifest[path] = [sha, run_id, depth]
+
+        # The manifest is stored as changes against the previous run's, with a full copy
+        # every ARCHIVE_KEYFRAME_INTERVAL runs to bound the chain
+        index = {"run_id": run_id, "blobs": {sha: blob[:3] for sha, blob in blobs.items()}}
+        manifest_depth = self._index(runs[-1]).get("manifest_depth", 0) + 1 if runs else 0
+        if runs and manifest_depth < ARCHIVE_KEYFRAME_INTERVAL:
+            index.update(base=runs[-1], manifest_depth=manifest_depth,
+                         changed={path: entry for path, entry in manifest.items() if previous.get(path) != entry})
+        else:
+            index["files"] = manifest
+        packed = zlib.compress(json.dumps(index, separators=(",", ":")).encode("utf-8"), 9)
+
+        self.runs_dir.mkdir(parents=True, exist_ok=True)
+        pack_path = self.runs_dir / f"{run_id}.pack"
+        # Exclusive create (O_CREAT|O_EXCL) never replaces an existing pack, and needs no hard links
+        with open(pack_path, "xb") as f:
+            try:
+                f.write(struct.pack("<I", len(packed)))
+                f.write(packed)
+                f.write(data)
+            except BaseException:
+                f.close()
+                pack_path.unlink()
+                raise
+
+        # Round-trip check: the stored manifest and every new blob read back as written
+        if self.manifest(run_id) != manifest:
+            raise RuntimeError(f"Archived run {run_id}: manifest does not read back")
+        for path, content in files.items():
+            entry = manifest[path]
+            if entry[1] == run_id and hashlib.sha256(self._blob(entry[0], run_id)).hexdigest() != entry[0]:
+                raise RuntimeError(f"Archived run {run_id}: {path} does not read back")
+        return run_id
+
+def split_delta_tokens(text):
+    """Split text after newlines and tag ends, so minified single-line pages still diff finely"""
+    return re.split(r"(?<=[\n>])", text)
+
+def delta_ops(old, new):
+    """Encode new as copy ranges of old's tokens ([start, end]) and inserted strings"""
+    old_tokens, new_tokens = split_delta_tokens(old), split_delta_tokens(new)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif j2 > j1:
+            ops.append("".join(new_tokens[j1:j2]))
+    return ops
+
+class ArchivingBackend(OutputBackend):
+    """Forward writes to another backend and archive everything written when closed"""
+
+    def __init__(self, inner, archive, minify=False):
+        super().__init__(minify)
+        self.inner = inner
+        self.archive = archive
+        self.files = {}
+
+    def write_bytes(self, path, data):
+        self.files[path] = data
+        self.inner.write_bytes(path, data)
+
+    def write_internal(self, path, data):
+        self.files[path] = data
+
+    def read_text(self, path):
+        return self.inner.read_text(path)
+
+    def flush(self):
+        self.inner.flush()
+
+    def close(self):
+        self.inner.close()
+        if self.files:
+            run_id = self.archive.commit(self.files)
+            print(f"Archived run {run_id} ({len(self.files)} files)")
+
+    def __str__(self):
+        return str(self.inner)
+
+def open_backend(destination, minify=False, endpoint=None, workers=8):
+    """Pick an output backend from a destination: directory, bundle file or s3://bucket/prefix"""
+    if destination.startswith("s3://"):
+        bucket, _, prefix = destination[5:].partition("/")
+        endpoint = endpoint or os.environ.get("S3_ENDPOINT_URL") or "https://s3.amazonaws.com"
+        return ObjectStoreBackend(endpoint, bucket, prefix, workers, minify=minify)
+    if destination.endswith(BUNDLE_SUFFIXES):
+        return BundleBackend(destination, minify)
+    return LocalBackend(destination, minify)
+
+class ObjectStoreStandinHandler(http.server.BaseHTTPRequestHandler):
+    """Minimal S3 stand-in: PUT/GET/HEAD of path-style objects stored under a directory"""
+
+    protocol_version = "HTTP/1.1"
+    root = None
+
+    def _object_path(self):
+        key = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path).lstrip("/")
+        target = (self.root / key).resolve()
+        return target if target.is_relative_to(self.root) and key else None
+
+    def _reply(self, status, body=b""):
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_PUT(self):
+        target = self._object_path()
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if target is None:
+            return self._reply(400)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        self._reply(200)
+
+    def do_GET(self):
+        target = self._object_path()
+        if target is None or not target.is_file():
+            return self._reply(404)
+        self._reply(200, target.read_bytes())
+
+    do_HEAD = do_GET
+
+    def log_message(self, format, *args):
+        pass
+
+def serve_object_store_standin(root, port=9000):
+    """Run the local S3 stand-in, storing objects as <root>/<bucket>/<key>"""
+    handler = type("Handler", (ObjectStoreStandinHandler,), {"root": Path(root).resolve()})
+    handler.root.mkdir(parents=True, exist_ok=True)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", port), handler)
+    print(f"Object store stand-in on http://127.0.0.1:{server.server_port} -> {handler.root}")
+    return server
+
+def template_fingerprint(source=None):
+    """Hash of this script's rendering code, i.e. everything but the dataset literals"""
+    source = Path(__file__).read_text(encoding="utf-8") if source is None else source
+    return hashlib.sha256(DATASET_BLOCK.sub(r"\1 = ...", source).encode("utf-8")).hexdigest()[:16]
+
+def load_script_dataset(source):
+    """(yearly data, account data, territories) parsed from the literals in this script's source"""
+    blocks = {match.group(1): ast.literal_eval(match.group(2)) for match in DATASET_BLOCK.finditer(source)}
+    return blocks["AGENCY_YEARLY_DATA"], blocks["ACCOUNT_DATA"], blocks["TERRITORIES"]
+
+def build_agency_entry(agency_name, yearly_data):
+    """Compute the token, territory and metrics entry for one agency"""
+    return {
+        "token": generate_token(agency_name),
+        "territory": TERRITORIES.get(agency_name, "Unknown"),
+        "metrics": calculate_metrics(agency_name, yearly_data)
+    }
+
+def enrich_metrics(agencies_data, peer_reference=None, rules=None):
+    """Run the batch stages over all agencies and attach their results to each agency's metrics"""
+    # Forecast every agency in one batched fit
+    forecasts = forecast_agencies({agency: data["metrics"]["yearly_data"] for agency, data in agencies_data.items()})
+    for agency_name, forecast in forecasts.items():
+        agencies_data[agency_name]["metrics"]["forecast"] = forecast
+
+    # Peer percentiles across all agencies, one sort per metric
+    values = dict(peer_reference or {})
+    values.update({agency: peer_values(data["metrics"]) for agency, data in agencies_data.items()})
+    for agency_name, ranks in rank_peers(values).items():
+        if agency_name in agencies_data:
+            agencies_data[agency_name]["metrics"]["peers"] = ranks
+
+    # Account concentration and churn, one pass over every agency's accounts
+    for agency_name, analytics in analyze_accounts(list(agencies_data)).items():
+        agencies_data[agency_name]["metrics"]["account_analytics"] = analytics
+
+    # Recommendations: rules compiled once and evaluated across all agencies; uses the stages above
+    facts = build_recommendation_facts(agencies_data)
+    for agency_name, recommendations in evaluate_rules(facts, compile_rules(rules)).items():
+        agencies_data[agency_name]["metrics"]["recommendations"] = recommendations
+
+    # Account coverage of each agency's totals, one grouped aggregation
+    for agency_name, reconciliation in reconcile_accounts(agencies_data).items():
+        agencies_data[agency_name]["metrics"]["reconciliation"] = reconciliation
+
+def write_agency_report(backend, agency_name, data):
+    """Render one agency report to agency-reports/<token>.html"""
+    backend.write_page(f"{REPORTS_DIR}/{data['token']}.html", generate_html_report(agency_name, data["metrics"], data["token"]))
+    # Computed metrics are kept alongside the page for the archive, not published
+    metrics = json.dumps({"agency": agency_name, **data}, indent=1, sort_keys=True, default=str)
+    backend.write_internal(f"{ARCHIVE_INTERNAL_DIR}/{data['token']}.json", metrics.encode("utf-8"))
+    print(f"Generated: {agency_name} -> {data['token']}.html")
+
+def regenerate_agency(backend, agency=None, token=None, snapshot_path=None, pdf=False):
+    """Re-render a single agency's report and patch its row into index.html"""
+    loaded = load_agency(agency, token, snapshot_path)
+    if loaded is None:
+        raise SystemExit(f"Unknown agency: {agency or token}")
+    agency_name, yearly_data, accounts, territory = loaded
+    if sum(yearly_data.values()) < 50000:
+        print(f"Skipped: {agency_name} has minimal data")
+        return
+
+    # Only this agency's rows are in play for the render
+    use_dataset({agency_name: yearly_data}, {agency_name: accounts}, {agency_name: territory})
+    data = build_agency_entry(agency_name, yearly_data)
+    # Rank against the other agencies as of the last full build
+    previous = load_diff_state(backend).get("agencies", {})
+    enrich_metrics({agency_name: data}, {
+        entry["agency"]: entry["peer_values"] for entry in previous.values() if "peer_values" in entry
+    })
+    write_agency_report(backend, agency_name, data)
+    if pdf:
+        write_pdf_reports(backend, {agency_name: data}, workers=1)
+
+    index_path = f"{REPORTS_DIR}/index.html"
+    index_html = backend.read_text(index_path)
+    if index_html is not None:
+        backend.write_page(index_path, patch_index_row(index_html, agency_name, data))
+        print(f"Patched: {index_path}")
+
+def run_build(args, archive=None):
+    """One build, or single-agency regeneration, as configured on the command line"""
+    # When archiving, the wrapper minifies so the archive holds exactly what was published
+    backend = open_backend(args.output, args.minify and not archive, args.s3_endpoint, args.upload_workers)
+    if archive:
+        backend = ArchivingBackend(backend, archive, args.minify)
+    with backend:
+        if args.agency or args.token:
+            regenerate_agency(backend, args.agency, args.token, args.snapshot, args.pdf)
+        else:
+            build_site(backend, args.snapshot, args.strict, args.full, args.pdf, args.pdf_workers, args.shard, args.build_id)
+
+        if args.minify:
+            before, after = backend.minify_savings(f"{REPORTS_DIR}/")
+            saved = before - after
+            print(f"Minified agency-reports: {before:,} -> {after:,} bytes ({saved:,} saved, {saved / before * 100 if before else 0:.1f}%)")
+
+def watch(args, archive=None, interval=0.2):
+    """Rebuild whenever this script or the snapshot changes, once edits have settled"""
+    script = Path(__file__).resolve()
+    paths = [script] + ([args.snapshot] if args.snapshot else [])
+
+    def mtimes():
+        return {path: path.stat().st_mtime_ns if path.exists() else None for path in paths}
+
+    template = template_fingerprint()
+    seen = mtimes()
+    run_build(args, archive)
+    print(f"\nWatching {', '.join(str(path) for path in paths)} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(interval)
+            current = mtimes()
+            if current == seen:
+                continue
+            while current != seen:
+                seen = current
+                time.sleep(args.debounce)
+                current = mtimes()
+
+            started = time.perf_counter()
+            source = script.read_text(encoding="utf-8")
+            try:
+                compile(source, str(script), "exec")
+                dataset = load_script_dataset(source)
+            except (SyntaxError, ValueError, KeyError) as exc:
+                print(f"Not rebuilding, {script.name} does not parse: {exc}")
+                continue
+            if template_fingerprint(source) != template:
+                print("Templates changed, restarting")
+                os.execv(sys.executable, [sys.executable] + sys.argv)
+            if not args.snapshot:
+                use_dataset(*dataset)
+            try:
+                run_build(args, archive)
+            except (Exception, SystemExit) as exc:
+                print(f"Build failed: {exc}")
+                continue
+            print(f"Rebuilt in {time.perf_counter() - started:.2f}s")
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate BainUltra agency reports")
+    parser.add_argument("--output", default=str(SITE_DIR),
+                        help="site directory, a .tar/.tar.gz/.zip bundle, or s3://bucket/prefix (default: %(default)s)")
+    parser.add_argument("--s3-endpoint", help="S3-compatible endpoint URL for s3:// output (default: $S3_ENDPOINT_URL)")
+    parser.add_argument("--upload-workers", type=int, default=8, help="concurrent uploads for s3:// output")
+    parser.add_argument("--serve-object-store", type=Path, metavar="DIR", help="run a local S3 stand-in storing objects in DIR")
+    parser.add_argument("--port", type=int, default=9000, help="port for --serve-object-store")
+    parser.add_argument("--snapshot", type=Path, help="load the dataset from a compiled binary snapshot")
+    parser.add_argument("--compile-snapshot", type=Path, metavar="PATH", help="write the built-in dataset to a snapshot and exit")
+    parser.add_argument("--minify", action="store_true", help="minify generated HTML and report the byte savings")
+    parser.add_argument("--strict", action="store_true", help="abort the build if data validation finds errors")
+    parser.add_argument("--pdf", action="store_true", help="also render a print-ready PDF of each agency report")
+    parser.add_argument("--pdf-workers", type=int, help="processes used to render PDFs (default: CPU count)")
+    parser.add_argument("--watch", action="store_true", help="rebuild affected pages whenever the data or templates change")
+    parser.add_argument("--debounce", type=float, default=0.3, help="seconds of quiet before a --watch rebuild (default: %(default)s)")
+    parser.add_argument("--full", action="store_true", help="re-render every agency report, even those unchanged since the last run")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N",
+                        help="render only shard i of N (agencies partitioned by token hash) and write a partial manifest")
+    parser.add_argument("--merge-shards", type=int, metavar="N", help="assemble the index and site-wide pages from N shard manifests")
+    parser.add_argument("--local-shards", type=int, metavar="N", help="run an N-way sharded build as local processes, then merge")
+    parser.add_argument("--build-id", metavar="ID",
+                        help="identify one sharded build; give every --shard run and the --merge-shards run the same ID")
+    parser.add_argument("--archive", type=Path, metavar="DIR", help="archive this run's metrics and pages as deltas in DIR")
+    parser.add_argument("--archive-list", action="store_true", help="list archived runs and exit")
+    parser.add_argument("--archive-get", nargs=2, metavar=("RUN", "PATH"), help="print one archived file as of RUN and exit")
+    parser.add_argument("--archive-restore", metavar="RUN", help="write every archived file as of RUN to --output and exit")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--agency", help="regenerate only this agency's report and index row")
+    target.add_argument("--token", help="regenerate only the agency with this report token")
+    args = parser.parse_args()
+
+    if args.compile_snapshot:
+        compile_snapshot(args.compile_snapshot)
+        print(f"Snapshot written: {args.compile_snapshot}")
+        return
+    if args.serve_object_store:
+        server = serve_object_store_standin(args.serve_object_store, args.port)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
+        return
+
+    archive = ReportArchive(args.archive) if args.archive else None
+    if args.archive_list or args.archive_get or args.archive_restore:
+        if archive is None:
+            parser.error("--archive DIR is required to read the archive")
+        if args.archive_list:
+            for run_id in archive.runs():
+                print(f"{run_id}  {len(archive.manifest(run_id))} files")
+        elif args.archive_get:
+            sys.stdout.buffer.write(archive.read(archive.resolve_run(args.archive_get[0]), args.archive_get[1]))
+        else:
+            run_id = archive.resolve_run(args.archive_restore)
+            # Internal files stay in the archive (see --archive-get); restoring them would publish them
+            published = [path for path in archive.manifest(run_id) if not path.startswith(f"{ARCHIVE_INTERNAL_DIR}/")]
+            with open_backend(args.output, endpoint=args.s3_endpoint, workers=args.upload_workers) as backend:
+                for path in published:
+                    backend.write_bytes(path, archive.read(run_id, path))
+            print(f"Restored run {run_id} to {args.output} ({len(published)} files)")
+        return
+
+    if (args.agency or args.token) and args.output.endswith(BUNDLE_SUFFIXES):
+        parser.error("--agency/--token would replace the whole bundle; rebuild the site into it instead")
+    sharded = args.shard or args.merge_shards or args.local_shards
+    if sharded and (args.agency or args.token or args.watch or archive):
+        parser.error("sharded builds cannot be combined with --agency/--token, --watch or --archive")
+    if sharded and args.output.endswith(BUNDLE_SUFFIXES):
+        parser.error("sharded builds need a directory or s3:// output that every shard can write to")
+    if args.local_shards:
+        run_local_shards(args, args.local_shards)
+    elif args.merge_shards:
+        with open_backend(args.output, args.minify, args.s3_endpoint, args.upload_workers) as backend:
+            merge_shards(backend, args.merge_shards, args.snapshot, args.strict, args.build_id)
+    elif args.watch:
+        watch(args, archive)
+    else:
+        run_build(args, archive)
+
+def parse_shard(spec):
+    """Parse a --shard value "i/N" into (i, N) with 0 <= i < N"""
+    index, _, count = spec.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {spec!r}")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be in 0..{count - 1}, got {index}")
+    return index, count
+
+def in_shard(token, shard):
+    """Whether an agency (by report token, itself a hash) belongs to shard (i, N)"""
+    return shard is None or int(token, 16) % shard[1] == shard[0]
+
+def shard_manifest_path(index, count):
+    return f"{REPORTS_DIR}/shards/{index}-of-{count}.json"
+
+def shard_state_path(index, count):
+    return f"{REPORTS_DIR}/shards/state-{index}-of-{count}.json"
+
+def load_shard_manifests(backend, count, expected):
+    """Read every partial manifest of a sharded build and combine them in dataset order"""
+    agencies_data, changes, missing, foreign = {}, {}, [], []
+    for index in range(count):
+        text = backend.read_text(shard_manifest_path(index, count))
+        if text is None:
+            missing.append(f"{index}/{count}")
+            continue
+        manifest = json.loads(text)
+        # A manifest left over from another build (other data, templates or build id) can't be mixed in
+        differing = [key for key, value in expected.items() if manifest.get(key) != value]
+        if differing:
+            foreign.append(f"{index}/{count} ({', '.join(differing)} differ)")
+            continue
+        for agency_name, data in manifest["agencies"].items():
+            # JSON object keys are strings; the metrics use integer years
+            data["metrics"]["yearly_data"] = {int(year): value for year, value in data["metrics"]["yearly_data"].items()}
+            agencies_data[agency_name] = data
+        changes.update(manifest["changes"])
+    if missing:
+        raise SystemExit(f"Missing shard manifests: {', '.join(missing)}")
+    if foreign:
+        raise SystemExit(f"Shard manifests from a different build: {', '.join(foreign)}")
+    order = {agency: i for i, agency in enumerate(AGENCY_YEARLY_DATA)}
+    return dict(sorted(agencies_data.items(), key=lambda item: (order.get(item[0], len(order)), item[0]))), changes
+
+def write_changes(backend, changes, previous_generated, generated):
+    """Write the change summary page and its JSON feed"""
+    backend.write_page(f"{REPORTS_DIR}/changes.html", generate_changes_page(changes, previous_generated))
+    backend.write_text(f"{REPORTS_DIR}/changes.json", json.dumps({
+        "previous_run": previous_generated,
+        "generated": generated,
+        "changes": {token: {**change, "summary": describe_change(change)} for token, change in changes.items()}
+    }, indent=1))
+
+def write_site_pages(backend, agencies_data, issues, rollup_agencies=None):
+    """Write the pages built from every agency"""
+    backend.write_page(f"{REPORTS_DIR}/validation.html", generate_validation_page(issues))
+
+    # Generate index page
+    backend.write_page(f"{REPORTS_DIR}/index.html", generate_index_page(agencies_data))
+
+    # Region and country rollups, aggregated once from the agency metrics
+    rollups = build_territory_rollups(agencies_data)
+    rollup_count = write_rollup_reports(backend, rollups, agencies_data, agencies=rollup_agencies)
+    print(f"Generated {rollup_count} territory rollup reports")
+
+    # Columnar export of computed metrics for BI tools
+    for path in export_metrics(backend, agencies_data):
+        print(f"Exported: {path}")
+
+    # Company-wide at-risk accounts report (internal)
+    at_risk = find_at_risk_accounts()
+    backend.write_page(f"{REPORTS_DIR}/at-risk.html", generate_at_risk_page(at_risk))
+    backend.write_text(f"{REPORTS_DIR}/at-risk.csv", generate_at_risk_csv(at_risk))
+    print(f"At-risk report: {at_risk['total_count']} accounts, ${at_risk['total_lost']:,.0f} lost")
+
+    # Generate top-level overview pages from the same in-memory metrics
+    summary = calculate_network_summary(agencies_data)
+    overview_pages = {
+        "index.html": generate_overview_page(summary),
+        "agencies.html": generate_agencies_page(summary),
+        "2024-vs-2025.html": generate_comparison_page(summary)
+    }
+    for filename, page_html in overview_pages.items():
+        backend.write_page(filename, page_html)
+        print(f"Generated overview: {filename}")
+
+def print_url_mapping(agencies_data):
+    print("\n=== Agency URL Mapping ===")
+    for agency, data in sorted(agencies_data.items()):
+        print(f"{agency}: {data['token']}.html")
+
+def report_validation(strict=False):
+    """Validate the source data, print the errors and abort under --strict; returns the issues"""
+    issues = validate_dataset()
+    errors = [issue for issue in issues if issue["severity"] == "error"]
+    for issue in errors:
+        print(f"Validation error: {issue['agency']}: {issue['detail']}")
+    print(f"Validation: {len(errors)} errors, {len(issues) - len(errors)} warnings/notes")
+    if strict and errors:
+        raise SystemExit("Aborting: data validation failed (--strict)")
+    return issues
+
+def build_keys(backend):
+    """Fingerprints of the templates and output options (render_key) and of the source data (data_key)"""
+    render_key = f"{template_fingerprint()}:{backend.minify}"
+    data_key = hashlib.sha256(
+        json.dumps([AGENCY_YEARLY_DATA, ACCOUNT_DATA, TERRITORIES], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()[:16]
+    return render_key, data_key
+
+def build_site(backend, snapshot_path=None, strict=False, full=False, pdf=False, pdf_workers=None, shard=None, build_id=None):
+    """Generate every agency report, internal page, export and overview page"""
+    if snapshot_path:
+        with Snapshot(snapshot_path) as snapshot:
+            use_dataset(*snapshot.to_dataset())
+
+    # Dependency graph, relative to the previous run to this destination: a template change
+    # (or --full) rebuilds everything; otherwise each agency's report depends on its own digest,
+    # region/country rollups on their member agencies, and the remaining site-wide pages on the
+    # whole dataset. Each shard keeps its own state.
+    state_path = DIFF_STATE_PATH if shard is None else shard_state_path(*shard)
+    previous = load_diff_state(backend, state_path)
+    render_key, data_key = build_keys(backend)
+    render_all = full or previous.get("render_key") != render_key
+    site_stale = render_all or previous.get("data_key") != data_key
+
+    # Validate the source data before anything is rendered
+    issues = report_validation(strict)
+
+    agencies_data = {}
+
+    # Process each agency
+    for agency_name, yearly_data in AGENCY_YEARLY_DATA.items():
+        # Skip agencies with minimal data
+        if sum(yearly_data.values()) < 50000:
+            continue
+
+        agencies_data[agency_name] = build_agency_entry(agency_name, yearly_data)
+
+    enrich_metrics(agencies_data)
+    selected = {agency: data for agency, data in agencies_data.items() if in_shard(data["token"], shard)}
+
+    # Diff against the previous run; only agencies whose inputs changed are re-rendered
+    state = dict(build_diff_state(selected, render_key), data_key=data_key)
+    # With no previous state there is nothing to compare, so the run just sets the baseline
+    changes = diff_agency_states(previous["agencies"], state["agencies"]) if previous else {}
+    for token, change in sorted(changes.items(), key=lambda item: item[1]["agency"]):
+        print(f"Changed: {change['agency']}: {describe_change(change)}")
+    print(f"Changes since last run: {len(changes)} agencies")
+
+    # Reports are re-rendered when anything they show moved, including peer ranks
+    prior_agencies = previous.get("agencies", {})
+    stale = {token for token, entry in state["agencies"].items() if prior_agencies.get(token, {}).get("digest") != entry["digest"]}
+    rendered = {}
+    for agency_name, data in selected.items():
+        if render_all or data["token"] in stale:
+            write_agency_report(backend, agency_name, data)
+            rendered[agency_name] = data
+    if len(rendered) < len(selected):
+        print(f"Unchanged since last run, not re-rendered: {len(selected) - len(rendered)} agency reports")
+    # PDFs follow the HTML reports, except that all are rendered when the last run made none
+    pdf_targets = rendered if previous.get("pdf") else selected
+    if pdf and pdf_targets:
+        print(f"Generated {write_pdf_reports(backend, pdf_targets, pdf_workers)} PDF reports")
+    state["pdf"] = pdf
+
+    if shard is not None:
+        # Every report must be stored before the manifest and state record it as current
+        backend.flush()
+        # The merge step assembles the index and site-wide pages from every shard's manifest
+        backend.write_text(shard_manifest_path(*shard), json.dumps({
+            "shard": shard[0],
+            "of": shard[1],
+            "build_id": build_id,
+            "data_key": data_key,
+            "render_key": render_key,
+            "previous_run": previous.get("generated"),
+            "generated": state["generated"],
+            "agencies": selected,
+            "changes": changes
+        }, sort_keys=True, default=str))
+        backend.write_text(state_path, json.dumps(state, separators=(",", ":")))
+        print(f"\nGenerated {len(rendered)} agency reports (shard {shard[0]}/{shard[1]}: {len(selected)} of {len(agencies_data)} agencies)")
+        return
+
+    write_changes(backend, changes, previous.get("generated"), state["generated"])
+    if site_stale:
+        write_site_pages(backend, agencies_data, issues, None if render_all else {c["agency"] for c in changes.values()})
+    else:
+        print("Source data unchanged since last run, site-wide pages not regenerated")
+    # Saved last, once every upload has succeeded: a run that fails before here leaves the
+    # previous state, so its pages are retried
+    backend.flush()
+    backend.write_text(state_path, json.dumps(state, separators=(",", ":")))
+
+    print(f"\nGenerated {len(rendered)} agency reports")
+    print(f"Index page: {backend}/{REPORTS_DIR}/index.html")
+
+    # Print URL mapping
+    print_url_mapping(agencies_data)
+
+def merge_shards(backend, count, snapshot_path=None, strict=False, build_id=None):
+    """Assemble the index, site-wide pages and URL mapping from a count-way sharded build's manifests"""
+    if snapshot_path:
+        with Snapshot(snapshot_path) as snapshot:
+            use_dataset(*snapshot.to_dataset())
+    issues = report_validation(strict)
+    render_key, data_key = build_keys(backend)
+    expected = {"build_id": build_id, "data_key": data_key, "render_key": render_key}
+    agencies_data, changes = load_shard_manifests(backend, count, expected)
+    print(f"Merging {count} shards: {len(agencies_data)} agencies, {len(changes)} changed")
+    manifest = json.loads(backend.read_text(shard_manifest_path(0, count)))
+    write_changes(backend, changes, manifest["previous_run"], manifest["generated"])
+    write_site_pages(backend, agencies_data, issues)
+
+    # Combined state, so single-agency rebuilds rank against every agency
+    states = [load_diff_state(backend, shard_state_path(index, count)) for index in range(count)]
+    combined = {token: entry for state in states for token, entry in state.get("agencies", {}).items()}
+    backend.flush()
+    backend.write_text(DIFF_STATE_PATH, json.dumps(dict(states[0], agencies=combined), separators=(",", ":")))
+
+    print(f"Index page: {backend}/{REPORTS_DIR}/index.html")
+    print_url_mapping(agencies_data)
+
+def run_local_shards(args, count):
+    """Run a count-way sharded build as separate local processes, then merge their manifests"""
+    argv, skip = [], False
+    for arg in sys.argv[1:]:
+        if skip or arg.startswith("--local-shards="):
+            skip = False
+        elif arg == "--local-shards":
+            skip = True
+        else:
+            argv.append(arg)
+    # One id for the shards and the merge, so manifests from any earlier build are rejected
+    build_id = args.build_id or datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    if not args.build_id:
+        argv += ["--build-id", build_id]
+    started = time.perf_counter()
+    workers = [
+        subprocess.Popen([sys.executable, str(Path(__file__).resolve()), *argv, "--shard", f"{index}/{count}"],
+                         stdout=subprocess.DEVNULL)
+        for index in range(count)
+    ]
+    failed = [f"{index}/{count}" for index, worker in enumerate(workers) if worker.wait() != 0]
+    if failed:
+        raise SystemExit(f"Shards failed: {', '.join(failed)}")
+    print(f"{count} shards built in {time.perf_counter() - started:.2f}s")
+    with open_backend(args.output, args.minify, args.s3_endpoint, args.upload_workers) as backend:
+        merge_shards(backend, count, args.snapshot, args.strict, build_id)
 
 if __name__ == "__main__":
     main()